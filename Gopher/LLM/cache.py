@@ -0,0 +1,157 @@
+import os
+import json
+import hashlib
+import logging
+import shutil
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+
+class ResponseCache:
+    """
+    Exact-match cache for LLM replies: an in-memory LRU in front of one file per key on disk,
+    so repeated deterministic prompts are answered without an API round-trip, also across runs.
+    """
+
+    def __init__(self, cache_dir: str = ".llm_cache", max_entries: int = 1024):
+        self.cache_dir = Path(cache_dir)
+        self.max_entries = max_entries
+        self._memory: "OrderedDict[str, str]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(model_name: str, temperature: float, system_message: str, user_prompt: str) -> str:
+        raw = f"{model_name}|{temperature}|{system_message}|{user_prompt}"
+        return hashlib.blake2b(raw.encode("utf-8"), digest_size=16).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                return self._memory[key]
+
+        path = self.cache_dir / f"{key}.txt"
+        if not path.exists():
+            return None
+
+        try:
+            value = path.read_text(encoding="utf-8")
+        except OSError as e:
+            logger.warning(f"Failed to read cached response {path}: {e}")
+            return None
+
+        self._remember(key, value)
+        return value
+
+    def set(self, key: str, value: str):
+        self._remember(key, value)
+
+        try:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.cache_dir / f"{key}.{os.getpid()}.tmp"
+            tmp_path.write_text(value, encoding="utf-8")
+            os.replace(tmp_path, self.cache_dir / f"{key}.txt")
+        except OSError as e:
+            logger.warning(f"Failed to persist cached response {key}: {e}")
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+        if self.cache_dir.exists():
+            shutil.rmtree(self.cache_dir, ignore_errors=True)
+
+    def _remember(self, key: str, value: str):
+        with self._lock:
+            self._memory[key] = value
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_entries:
+                self._memory.popitem(last=False)
+
+
+class SemanticCache:
+    """
+    Near-duplicate cache: embeds the user prompt and returns the reply of the most similar
+    earlier prompt when cosine similarity reaches `threshold`. Entries only match when the
+    system message is identical, so replies never bleed across tasks.
+    Requires the optional `faiss-cpu` and `sentence-transformers` packages.
+    """
+
+    def __init__(self,
+                 cache_dir: str = ".llm_cache/semantic",
+                 model_name: str = "sentence-transformers/all-MiniLM-L6-v2",
+                 threshold: float = 0.92):
+        try:
+            import faiss
+            import numpy as np
+            from sentence_transformers import SentenceTransformer
+        except ImportError as e:
+            raise ImportError("SemanticCache requires 'faiss-cpu' and 'sentence-transformers' to be installed.") from e
+
+        self._faiss = faiss
+        self._np = np
+        self.cache_dir = Path(cache_dir)
+        self.threshold = threshold
+        self._lock = threading.Lock()
+
+        self.encoder = SentenceTransformer(model_name, device="cpu")
+        self._index_path = self.cache_dir / "index.faiss"
+        self._entries_path = self.cache_dir / "entries.json"
+
+        if self._index_path.exists() and self._entries_path.exists():
+            self.index = faiss.read_index(str(self._index_path))
+            with open(self._entries_path, 'r', encoding='utf-8') as f:
+                self._entries = json.load(f)
+        else:
+            self.index = faiss.IndexFlatIP(self.encoder.get_sentence_embedding_dimension())
+            self._entries = []
+
+    def get(self, system_message: str, user_prompt: str) -> Optional[str]:
+        if not self._entries:
+            return None
+
+        vector = self._embed(user_prompt)
+        with self._lock:
+            scores, ids = self.index.search(vector, 1)
+            idx = int(ids[0][0])
+            if idx < 0 or float(scores[0][0]) < self.threshold:
+                return None
+            entry = self._entries[idx]
+
+        if entry["system"] != self._digest(system_message):
+            return None
+        return entry["response"]
+
+    def set(self, system_message: str, user_prompt: str, response: str):
+        vector = self._embed(user_prompt)
+        with self._lock:
+            self.index.add(vector)
+            self._entries.append({"system": self._digest(system_message), "response": response})
+            self._persist()
+
+    def clear(self):
+        with self._lock:
+            self.index.reset()
+            self._entries = []
+        if self.cache_dir.exists():
+            shutil.rmtree(self.cache_dir, ignore_errors=True)
+
+    def _embed(self, text: str):
+        vector = self.encoder.encode([text], normalize_embeddings=True)
+        return self._np.asarray(vector, dtype="float32")
+
+    @staticmethod
+    def _digest(text: str) -> str:
+        return hashlib.blake2b(text.encode("utf-8"), digest_size=16).hexdigest()
+
+    def _persist(self):
+        try:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            self._faiss.write_index(self.index, str(self._index_path))
+            with open(self._entries_path, 'w', encoding='utf-8') as f:
+                json.dump(self._entries, f)
+        except OSError as e:
+            logger.warning(f"Failed to persist semantic cache: {e}")
@@ -1,42 +1,148 @@
 import os
 import time
-import json
+import random
+import asyncio
+import functools
+import threading
 import logging
+import httpx
+import orjson
 import requests
+from requests.adapters import HTTPAdapter
 from abc import ABC, abstractmethod
-from typing import Optional, Dict, Any, Union
-import yaml
+from email.utils import parsedate_to_datetime
+from typing import Optional, Dict, Any, Union, Tuple, List, Callable, Iterator, Set
+
+from Gopher.core.config import load_yaml
+from Gopher.LLM.cache import ResponseCache, SemanticCache
 
 logger = logging.getLogger(__name__)
 
 class LLMError(Exception):
     pass
 
-def retry_with_backoff(max_retries: int = 5, backoff_factor: float = 2.0):
+class TokenBucket:
+    """Client-side rate limiter shared by all LLM clients in the process."""
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def configure(self, rate: float, burst: int):
+        with self._lock:
+            self.rate = rate
+            self.burst = burst
+            self._tokens = min(self._tokens, float(burst))
+
+    def _reserve(self) -> float:
+        # Takes a token and returns how long the caller must wait before using it
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._last) * self.rate)
+            self._last = now
+            self._tokens -= 1
+            if self._tokens >= 0:
+                return 0.0
+            return -self._tokens / self.rate
+
+    def acquire(self):
+        wait = self._reserve()
+        if wait > 0:
+            time.sleep(wait)
+
+    async def acquire_async(self):
+        wait = self._reserve()
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+_RATE_LIMITER = TokenBucket(rate=10.0, burst=10)
+
+def _retry_delay(e: Exception, prev_delay: float, base_delay: float, max_delay: float) -> float:
+    # A server-provided Retry-After wins over the computed backoff
+    response = getattr(e, "response", None)
+    retry_after = response.headers.get("Retry-After") if response is not None else None
+    if retry_after:
+        try:
+            return float(retry_after)
+        except ValueError:
+            try:
+                return max(0.0, parsedate_to_datetime(retry_after).timestamp() - time.time())
+            except (TypeError, ValueError):
+                pass
+
+    # Decorrelated jitter: keeps concurrent clients from retrying in lock-step
+    return min(max_delay, random.uniform(base_delay, prev_delay * 3))
+
+def _check_retriable(e: Exception):
+    # Don't retry on client side errors (400-499) unless it's 429 (Rate Limit)
+    if isinstance(e, (requests.exceptions.HTTPError, httpx.HTTPStatusError)) and e.response is not None:
+        status = e.response.status_code
+        if 400 <= status < 500 and status != 429:
+            logger.error(f"Non-retriable HTTP error: {status} - {e}")
+            raise e
+
+def _decode_json(response: Union[requests.Response, httpx.Response]) -> Any:
+    # orjson on the raw bytes skips the stdlib decode; malformed bodies stay retriable as LLMError
+    try:
+        return orjson.loads(response.content)
+    except orjson.JSONDecodeError as e:
+        raise LLMError(f"Invalid JSON in LLM response: {e}")
+
+def retry_with_backoff(max_retries: int = 5, base_delay: float = 1.0, max_delay: float = 60.0):
 
     def decorator(func):
+        @functools.wraps(func)
         def wrapper(*args, **kwargs):
             retry_count = 0
-            delay = 1.0
+            delay = base_delay
             last_exception = None
 
             while retry_count < max_retries:
+                _RATE_LIMITER.acquire()
                 try:
                     return func(*args, **kwargs)
                 except (requests.exceptions.RequestException, LLMError) as e:
-                    # Don't retry on client side errors (400-499) unless it's 429 (Rate Limit)
-                    if isinstance(e, requests.exceptions.HTTPError):
-                        status = e.response.status_code
-                        if 400 <= status < 500 and status != 429:
-                            logger.error(f"Non-retriable HTTP error: {status} - {e}")
-                            raise e
+                    _check_retriable(e)
 
                     last_exception = e
                     retry_count += 1
-                    sleep_time = delay * (backoff_factor ** (retry_count - 1))
+                    delay = _retry_delay(e, delay, base_delay, max_delay)
                     logger.warning(
-                        f"LLM request failed: {e}. Retrying in {sleep_time:.2f}s (Attempt {retry_count}/{max_retries})...")
-                    time.sleep(sleep_time)
+                        f"LLM request failed: {e}. Retrying in {delay:.2f}s (Attempt {retry_count}/{max_retries})...")
+                    time.sleep(delay)
+
+            logger.error(f"Max retries reached. Last error: {last_exception}")
+            raise last_exception
+
+        return wrapper
+
+    return decorator
+
+def async_retry_with_backoff(max_retries: int = 5, base_delay: float = 1.0, max_delay: float = 60.0):
+
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            retry_count = 0
+            delay = base_delay
+            last_exception = None
+
+            while retry_count < max_retries:
+                await _RATE_LIMITER.acquire_async()
+                try:
+                    return await func(*args, **kwargs)
+                except (httpx.HTTPError, LLMError) as e:
+                    _check_retriable(e)
+
+                    last_exception = e
+                    retry_count += 1
+                    delay = _retry_delay(e, delay, base_delay, max_delay)
+                    logger.warning(
+                        f"LLM request failed: {e}. Retrying in {delay:.2f}s (Attempt {retry_count}/{max_retries})...")
+                    await asyncio.sleep(delay)
 
             logger.error(f"Max retries reached. Last error: {last_exception}")
             raise last_exception
@@ -47,17 +153,188 @@ def retry_with_backoff(max_retries: int = 5, backoff_factor: float = 2.0):
 
 class BaseLLMClient(ABC):
 
+    POOL_CONNECTIONS = 32
+    POOL_MAXSIZE = 64
+    REQUEST_TIMEOUT = 60
+    # Switches on the built-in SSE streaming; other wire formats override _open_stream/_iter_stream
+    SUPPORTS_STREAMING = False
+
     def __init__(self, config: Dict[str, Any]):
         self.config = config
         self.model_name = config.get("model_name", "unknown")
         self.temperature = config.get("temperature", 0.0)  # Default to 0 for deterministic repairs
 
-    @abstractmethod
+        # One keep-alive session per client so repeated calls reuse the TCP/TLS connection.
+        # Retries are handled by retry_with_backoff, so the adapter itself never retries.
+        self._session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=self.POOL_CONNECTIONS,
+            pool_maxsize=self.POOL_MAXSIZE,
+            max_retries=0
+        )
+        self._session.mount("https://", adapter)
+        self._session.mount("http://", adapter)
+        self._headers = {"Content-Type": "application/json"}  # bodies are pre-serialized with orjson
+
+        # Only deterministic (temperature == 0) replies are cached, see _cache_key
+        self.cache_enabled = config.get("cache_enabled", True)
+        self._cache = ResponseCache(
+            cache_dir=config.get("cache_dir", ".llm_cache"),
+            max_entries=config.get("cache_size", 1024)
+        ) if self.cache_enabled else None
+
+        self._semantic_cache = None
+        semantic_cfg = config.get("semantic_cache") or {}
+        if self.cache_enabled and semantic_cfg.get("enabled", False):
+            try:
+                self._semantic_cache = SemanticCache(
+                    cache_dir=semantic_cfg.get("cache_dir", ".llm_cache/semantic"),
+                    model_name=semantic_cfg.get("model", "sentence-transformers/all-MiniLM-L6-v2"),
+                    threshold=semantic_cfg.get("threshold", 0.92)
+                )
+            except ImportError as e:
+                logger.warning(f"Semantic cache disabled: {e}")
+
+    def close(self):
+        session = getattr(self, "_session", None)
+        if session is not None:
+            session.close()
+
+    def __del__(self):
+        try:
+            self.close()
+        except Exception:
+            pass
+
     def generate_completion(self, system_message: str, user_prompt: str) -> str:
+        cached = self._lookup_cached(system_message, user_prompt)
+        if cached is not None:
+            return cached
+
+        response = self._do_generate(system_message, user_prompt)
+
+        self._store_cached(system_message, user_prompt, response)
+        return response
+
+    def stream_completion(self,
+                          system_message: str,
+                          user_prompt: str,
+                          stop_condition: Optional[Callable[[str], bool]] = None) -> Iterator[str]:
+        """
+        Yields the reply as content deltas while it is being generated. When `stop_condition`
+        returns True for the text received so far, the connection is closed and the stream ends.
+        Providers without streaming support yield the whole reply as one chunk.
+        """
+        cached = self._lookup_cached(system_message, user_prompt)
+        if cached is not None:
+            yield cached
+            return
+
+        if not self.SUPPORTS_STREAMING:
+            yield self.generate_completion(system_message, user_prompt)
+            return
+
+        response = self._open_stream(system_message, user_prompt)
+        parts = []
+        try:
+            for delta in self._iter_stream(response):
+                parts.append(delta)
+                yield delta
+                if stop_condition is not None and stop_condition("".join(parts)):
+                    logger.debug(f"Stop condition met, aborting {self.model_name} stream early.")
+                    return
+        finally:
+            # Also runs when the caller stops iterating, freeing the connection immediately
+            response.close()
+
+        # Only complete replies are cached
+        self._store_cached(system_message, user_prompt, "".join(parts))
+
+    @retry_with_backoff()
+    def _open_stream(self, system_message: str, user_prompt: str) -> requests.Response:
+        url, params, payload = self._build_request(system_message, user_prompt)
+        payload["stream"] = True
+
+        response = self._session.post(url, params=params, headers=self._headers, data=orjson.dumps(payload), stream=True, timeout=self.REQUEST_TIMEOUT)
+        if response.status_code != 200:
+            response.close()
+            response.raise_for_status()
+        return response
+
+    def _iter_stream(self, response: requests.Response) -> Iterator[str]:
+        # Server-sent events: one "data: {json}" line per chunk, terminated by "data: [DONE]"
+        for line in response.iter_lines():
+            if not line.startswith(b"data:"):
+                continue
+            data = line[5:].strip()
+            if data == b"[DONE]":
+                break
+            try:
+                delta = self._parse_stream_chunk(orjson.loads(data))
+            except (KeyError, IndexError, ValueError):
+                continue
+            if delta:
+                yield delta
+
+    def _parse_stream_chunk(self, data: Dict[str, Any]) -> Optional[str]:
+        """Extracts the content delta from one decoded stream event (OpenAI chunk format)."""
+        return data["choices"][0]["delta"].get("content")
+
+    def clear_cache(self):
+        if self._cache is not None:
+            self._cache.clear()
+        if self._semantic_cache is not None:
+            self._semantic_cache.clear()
+
+    def _lookup_cached(self, system_message: str, user_prompt: str) -> Optional[str]:
+        key = self._cache_key(system_message, user_prompt)
+        if key is None:
+            return None
+
+        cached = self._cache.get(key)
+        if cached is not None:
+            logger.debug(f"LLM cache hit for {self.model_name} ({key}).")
+            return cached
+
+        if self._semantic_cache is not None:
+            cached = self._semantic_cache.get(system_message, user_prompt)
+            if cached is not None:
+                logger.debug(f"LLM semantic cache hit for {self.model_name}.")
+                self._cache.set(key, cached)
+                return cached
+        return None
+
+    def _store_cached(self, system_message: str, user_prompt: str, response: str):
+        key = self._cache_key(system_message, user_prompt)
+        if key is None:
+            return
+
+        self._cache.set(key, response)
+        if self._semantic_cache is not None:
+            self._semantic_cache.set(system_message, user_prompt, response)
+
+    def _cache_key(self, system_message: str, user_prompt: str) -> Optional[str]:
+        if self._cache is None or self.temperature != 0:
+            return None
+        return ResponseCache.make_key(self.model_name, self.temperature, system_message, user_prompt)
+
+    @abstractmethod
+    def _do_generate(self, system_message: str, user_prompt: str) -> str:
+        pass
+
+    @abstractmethod
+    def _build_request(self, system_message: str, user_prompt: str) -> Tuple[str, Optional[Dict], Dict[str, Any]]:
+        """Returns (url, query_params, json_payload) for one completion call."""
+        pass
+
+    @abstractmethod
+    def _parse_response(self, data: Dict[str, Any]) -> str:
         pass
 
 class OpenAICompatibleClient(BaseLLMClient):
 
+    SUPPORTS_STREAMING = True
+
     def __init__(self, config: Dict[str, Any], api_key_env_var: str):
         super().__init__(config)
         self.api_key = os.getenv(api_key_env_var)
@@ -66,17 +343,33 @@ class OpenAICompatibleClient(BaseLLMClient):
         if not self.api_key:
             logger.warning(f"API Key environment variable '{api_key_env_var}' not set for {self.model_name}.")
 
+        self._headers["Authorization"] = f"Bearer {self.api_key}"
+
+        # OpenAI caches byte-identical prefixes automatically; Anthropic-compatible endpoints
+        # need the stable system prefix marked explicitly.
+        self.prompt_cache = config.get("prompt_cache", False)
+
     @retry_with_backoff()
-    def generate_completion(self, system_message: str, user_prompt: str) -> str:
-        headers = {
-            "Authorization": f"Bearer {self.api_key}",
-            "Content-Type": "application/json"
-        }
+    def _do_generate(self, system_message: str, user_prompt: str) -> str:
+        endpoint, params, payload = self._build_request(system_message, user_prompt)
+
+        response = self._session.post(endpoint, headers=self._headers, data=orjson.dumps(payload), timeout=self.REQUEST_TIMEOUT)
+        response.raise_for_status()
+
+        return self._parse_response(_decode_json(response))
+
+    def _build_request(self, system_message: str, user_prompt: str) -> Tuple[str, Optional[Dict], Dict[str, Any]]:
+        if self.prompt_cache:
+            system_content = [
+                {"type": "text", "text": system_message, "cache_control": {"type": "ephemeral"}}
+            ]
+        else:
+            system_content = system_message
 
         payload = {
             "model": self.model_name,
             "messages": [
-                {"role": "system", "content": system_message},
+                {"role": "system", "content": system_content},
                 {"role": "user", "content": user_prompt}
             ],
             "temperature": self.temperature,
@@ -84,11 +377,9 @@ class OpenAICompatibleClient(BaseLLMClient):
         }
 
         endpoint = f"{self.base_url.rstrip('/')}/chat/completions"
+        return endpoint, None, payload
 
-        response = requests.post(endpoint, headers=headers, json=payload, timeout=60)
-        response.raise_for_status()
-
-        data = response.json()
+    def _parse_response(self, data: Dict[str, Any]) -> str:
         try:
             return data["choices"][0]["message"]["content"]
         except (KeyError, IndexError):
@@ -101,12 +392,28 @@ class GoogleGenAIClient(BaseLLMClient):
         self.api_key = os.getenv(api_key_env_var)
         self.base_url = config.get("base_url", "https://generativelanguage.googleapis.com/v1beta/models")
 
+        # Server-side context caching of the system instruction via cachedContents
+        self.prompt_cache = config.get("prompt_cache", False)
+        self.prompt_cache_ttl = config.get("prompt_cache_ttl", 3600)
+        self._cached_contents: Dict[str, Tuple[Optional[str], float]] = {}
+        # Concurrent sessions would otherwise each create their own cachedContents on a miss
+        self._cached_contents_lock = threading.Lock()
+
     @retry_with_backoff()
-    def generate_completion(self, system_message: str, user_prompt: str) -> str:
+    def _do_generate(self, system_message: str, user_prompt: str) -> str:
+        url, params, payload = self._build_request(system_message, user_prompt)
+
+        response = self._session.post(url, params=params, headers=self._headers, data=orjson.dumps(payload), timeout=self.REQUEST_TIMEOUT)
+
+        if response.status_code != 200:
+            logger.error(f"Gemini API Error: {response.text}")
+            response.raise_for_status()
 
+        return self._parse_response(_decode_json(response))
+
+    def _build_request(self, system_message: str, user_prompt: str) -> Tuple[str, Optional[Dict], Dict[str, Any]]:
         url = f"{self.base_url}/{self.model_name}:generateContent"
         params = {"key": self.api_key}
-        headers = {"Content-Type": "application/json"}
 
         payload = {
             "systemInstruction": {
@@ -120,13 +427,48 @@ class GoogleGenAIClient(BaseLLMClient):
             }
         }
 
-        response = requests.post(url, params=params, headers=headers, json=payload, timeout=60)
+        cached_name = self._get_cached_content(system_message) if self.prompt_cache else None
+        if cached_name:
+            # The cached content already carries the system instruction
+            del payload["systemInstruction"]
+            payload["cachedContent"] = cached_name
 
-        if response.status_code != 200:
-            logger.error(f"Gemini API Error: {response.text}")
-            response.raise_for_status()
+        return url, params, payload
+
+    def _get_cached_content(self, system_message: str) -> Optional[str]:
+        with self._cached_contents_lock:
+            return self._get_cached_content_locked(system_message)
+
+    def _get_cached_content_locked(self, system_message: str) -> Optional[str]:
+        name, expires_at = self._cached_contents.get(system_message, (None, 0.0))
+        if time.time() < expires_at:
+            return name
+
+        root_url = self.base_url.rstrip("/").rsplit("/models", 1)[0]
+        body = {
+            "model": f"models/{self.model_name}",
+            "systemInstruction": {"parts": [{"text": system_message}]},
+            "ttl": f"{self.prompt_cache_ttl}s"
+        }
 
-        data = response.json()
+        try:
+            response = self._session.post(
+                f"{root_url}/cachedContents", params={"key": self.api_key},
+                headers=self._headers, data=orjson.dumps(body), timeout=self.REQUEST_TIMEOUT
+            )
+            response.raise_for_status()
+            name = orjson.loads(response.content)["name"]
+            logger.info(f"Created Gemini cached content {name} for system instruction.")
+        except (requests.exceptions.RequestException, KeyError, ValueError) as e:
+            # Typically the prefix is below the provider's minimum cacheable size; send it inline.
+            logger.warning(f"Gemini context caching unavailable, sending system instruction inline: {e}")
+            name = None
+
+        # Refresh a minute before the server-side TTL runs out; failures are not retried until then either
+        self._cached_contents[system_message] = (name, time.time() + max(0, self.prompt_cache_ttl - 60))
+        return name
+
+    def _parse_response(self, data: Dict[str, Any]) -> str:
         try:
             return data["candidates"][0]["content"]["parts"][0]["text"]
         except (KeyError, IndexError, TypeError):
@@ -138,6 +480,9 @@ class GoogleGenAIClient(BaseLLMClient):
 
 class OllamaClient(BaseLLMClient):
 
+    REQUEST_TIMEOUT = 300  # Longer timeout for local inference
+    SUPPORTS_STREAMING = True
+
     def __init__(self, config: Dict[str, Any], model_alias: str):
 
         super().__init__(config)
@@ -148,8 +493,56 @@ class OllamaClient(BaseLLMClient):
 
         self.options = config.get("options", {})
 
-    @retry_with_backoff(max_retries=3, backoff_factor=1.5)  # Fewer retries for local
-    def generate_completion(self, system_message: str, user_prompt: str) -> str:
+        # Ollama configs carry no model_name/temperature of their own; mirror the real
+        # tag and sampling temperature so logging, token limits and caching see them.
+        self.model_name = config.get("model_name", self.actual_model_tag)
+        self.temperature = self.options.get("temperature", self.temperature)
+
+    @retry_with_backoff(max_retries=3, max_delay=10.0)  # Fewer retries for local
+    def _do_generate(self, system_message: str, user_prompt: str) -> str:
+        endpoint, params, payload = self._build_request(system_message, user_prompt)
+
+        try:
+            response = self._session.post(endpoint, headers=self._headers, data=orjson.dumps(payload), timeout=self.REQUEST_TIMEOUT)
+            response.raise_for_status()
+        except requests.exceptions.ConnectionError:
+            raise LLMError(f"Could not connect to Ollama at {self.base_url}. Ensure it is running on the A800 node.")
+
+        return self._parse_response(_decode_json(response))
+
+    @retry_with_backoff(max_retries=3, max_delay=10.0)
+    def _open_stream(self, system_message: str, user_prompt: str) -> requests.Response:
+        endpoint, params, payload = self._build_request(system_message, user_prompt)
+        payload["stream"] = True
+
+        try:
+            response = self._session.post(endpoint, headers=self._headers, data=orjson.dumps(payload), stream=True, timeout=self.REQUEST_TIMEOUT)
+        except requests.exceptions.ConnectionError:
+            raise LLMError(f"Could not connect to Ollama at {self.base_url}. Ensure it is running on the A800 node.")
+
+        if response.status_code != 200:
+            response.close()
+            response.raise_for_status()
+        return response
+
+    def _iter_stream(self, response: requests.Response) -> Iterator[str]:
+        # Newline-delimited JSON frames; the last one has "done": true
+        for line in response.iter_lines():
+            if not line:
+                continue
+            try:
+                frame = orjson.loads(line)
+            except ValueError:
+                continue
+            if "error" in frame:
+                raise LLMError(f"Ollama stream error: {frame['error']}")
+            delta = frame.get("message", {}).get("content")
+            if delta:
+                yield delta
+            if frame.get("done"):
+                break
+
+    def _build_request(self, system_message: str, user_prompt: str) -> Tuple[str, Optional[Dict], Dict[str, Any]]:
         endpoint = f"{self.base_url}/api/chat"
 
         payload = {
@@ -161,40 +554,216 @@ class OllamaClient(BaseLLMClient):
             "stream": False,
             "options": self.options
         }
+        return endpoint, None, payload
 
+    def _parse_response(self, data: Dict[str, Any]) -> str:
         try:
-            response = requests.post(endpoint, json=payload, timeout=300)  # Longer timeout for local inference
-            response.raise_for_status()
-            data = response.json()
             return data["message"]["content"]
-        except requests.exceptions.ConnectionError:
-            raise LLMError(f"Could not connect to Ollama at {self.base_url}. Ensure it is running on the A800 node.")
         except KeyError:
-            raise LLMError(f"Unexpected Ollama response: {response.text}")
+            raise LLMError(f"Unexpected Ollama response: {data}")
+
+class AsyncLLMClient:
+    """
+    Async transport over a provider client: reuses its request building and response
+    parsing, but sends over a shared HTTP/2 httpx pool so callers can fan out with asyncio.gather.
+
+    Micro-batching is opt-in through the provider's `autobatch` config block
+    (`max_batch`, `max_wait_ms`): prompts that share a system message and arrive within
+    the wait window are sent as one numbered request and demultiplexed from a JSON array.
+    """
+
+    MAX_CONNECTIONS = 64
+    MAX_KEEPALIVE_CONNECTIONS = 32
+
+    BATCH_INSTRUCTION = (
+        'Respond as a JSON array [{"id": N, "answer": "..."}] with exactly one entry per task, '
+        'where N is the task number and answer is your complete response to that task.'
+    )
+
+    def __init__(self, client: BaseLLMClient):
+        self.client = client
+        self.model_name = client.model_name
+        self._http = httpx.AsyncClient(
+            http2=True,
+            limits=httpx.Limits(
+                max_connections=self.MAX_CONNECTIONS,
+                max_keepalive_connections=self.MAX_KEEPALIVE_CONNECTIONS
+            ),
+            timeout=client.REQUEST_TIMEOUT
+        )
+
+        batch_cfg = client.config.get("autobatch") or {}
+        self.max_batch = int(batch_cfg.get("max_batch", 1))
+        self.max_wait = batch_cfg.get("max_wait_ms", 10) / 1000.0
+        self._queue: Optional[asyncio.Queue] = None
+        self._flusher: Optional[asyncio.Task] = None
+        self._tasks: Set[asyncio.Task] = set()
+
+    async def generate_completion(self, system_message: str, user_prompt: str) -> str:
+        cached = self.client._lookup_cached(system_message, user_prompt)
+        if cached is not None:
+            return cached
+
+        if self.max_batch <= 1:
+            response = await self._complete(system_message, user_prompt)
+        else:
+            response = await self._enqueue(system_message, user_prompt)
+
+        self.client._store_cached(system_message, user_prompt, response)
+        return response
+
+    async def _enqueue(self, system_message: str, user_prompt: str) -> str:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        if self._queue is None:
+            self._queue = asyncio.Queue()
+        self._queue.put_nowait((system_message, user_prompt, future))
+
+        if self._flusher is None or self._flusher.done():
+            self._flusher = self._spawn(self._flush_loop())
+
+        return await future
+
+    def _spawn(self, coro) -> asyncio.Task:
+        # The event loop only keeps weak references to tasks; hold them until they finish
+        task = asyncio.get_running_loop().create_task(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
+
+    @async_retry_with_backoff()
+    async def _complete(self, system_message: str, user_prompt: str) -> str:
+        # Building a request can block on I/O (Gemini creates its cachedContents over HTTP), so keep it off the loop
+        url, params, payload = await asyncio.to_thread(self.client._build_request, system_message, user_prompt)
+
+        try:
+            response = await self._http.post(url, params=params, headers=self.client._headers, content=orjson.dumps(payload))
+        except httpx.ConnectError as e:
+            raise LLMError(f"Could not connect to {url}: {e}")
+
+        if response.status_code != 200:
+            logger.error(f"{self.model_name} API Error: {response.text}")
+            response.raise_for_status()
+
+        return self.client._parse_response(_decode_json(response))
+
+    async def _flush_loop(self):
+        loop = asyncio.get_running_loop()
+
+        while not self._queue.empty():
+            batch = [self._queue.get_nowait()]
+            deadline = loop.time() + self.max_wait
+
+            while len(batch) < self.max_batch:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+                except asyncio.TimeoutError:
+                    break
+
+            # Only prompts sharing the same system message can be merged into one request
+            groups: Dict[str, List] = {}
+            for item in batch:
+                groups.setdefault(item[0], []).append(item)
+
+            for system_message, items in groups.items():
+                self._spawn(self._dispatch(system_message, items))
+
+    async def _dispatch(self, system_message: str, items: List):
+        if len(items) == 1:
+            await self._resolve(items[0], self._complete(system_message, items[0][1]))
+            return
+
+        answers = None
+        try:
+            raw = await self._complete(system_message, self._compose_batch_prompt([item[1] for item in items]))
+            answers = self._split_batch_response(raw, len(items))
+        except Exception as e:
+            logger.warning(f"Batched request of {len(items)} prompts failed: {e}")
+
+        if answers is None:
+            logger.info(f"Falling back to single-call mode for {len(items)} prompts.")
+            await asyncio.gather(*[self._resolve(item, self._complete(system_message, item[1])) for item in items])
+            return
+
+        for item, answer in zip(items, answers):
+            if not item[2].done():
+                item[2].set_result(answer)
+
+    @staticmethod
+    async def _resolve(item, coro):
+        future = item[2]
+        try:
+            result = await coro
+        except Exception as e:
+            if not future.done():
+                future.set_exception(e)
+            return
+        if not future.done():
+            future.set_result(result)
+
+    def _compose_batch_prompt(self, prompts: List[str]) -> str:
+        tasks = [f"Task {i}:\n{prompt}" for i, prompt in enumerate(prompts, start=1)]
+        tasks.append(self.BATCH_INSTRUCTION)
+        return "\n\n".join(tasks)
+
+    @staticmethod
+    def _split_batch_response(raw: str, expected: int) -> Optional[List[str]]:
+        start, end = raw.find("["), raw.rfind("]")
+        if start < 0 or end <= start:
+            return None
+        try:
+            entries = orjson.loads(raw[start:end + 1])
+            answers = {int(entry["id"]): str(entry["answer"]) for entry in entries}
+        except (ValueError, KeyError, TypeError):
+            return None
+
+        if sorted(answers) != list(range(1, expected + 1)):
+            return None
+        return [answers[i] for i in range(1, expected + 1)]
+
+    async def aclose(self):
+        # Let in-flight batches resolve their callers before the HTTP pool goes away;
+        # the flusher may still spawn dispatches while we wait
+        while self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+        await self._http.aclose()
+        self.client.close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.aclose()
+
+# Hosted providers by name; new OpenAI-compatible endpoints only need an entry here and a config block
+_API_FACTORIES: Dict[str, Callable[[Dict[str, Any], str], BaseLLMClient]] = {
+    "google": GoogleGenAIClient,
+    "openai": OpenAICompatibleClient,
+    "deepseek": OpenAICompatibleClient,
+}
 
 class LLMFactory:
 
     @staticmethod
     def create_client(provider: str, config_path: str = "configs/settings.yaml", **kwargs) -> BaseLLMClient:
 
-        with open(config_path, 'r') as f:
-            full_config = yaml.safe_load(f)
+        full_config = load_yaml(config_path)
 
         llm_config = full_config.get("llm", {})
+
+        rate_limit = llm_config.get("rate_limit")
+        if rate_limit:
+            _RATE_LIMITER.configure(rate_limit.get("rate", 10.0), rate_limit.get("burst", 10))
         api_providers = llm_config.get("api_providers", {})
         local_providers = llm_config.get("local_providers", {})
 
-        if provider == "google":
-            conf = api_providers.get("google")
-            return GoogleGenAIClient(conf, conf["api_key_env"])
-
-        elif provider == "openai":
-            conf = api_providers.get("openai")
-            return OpenAICompatibleClient(conf, conf["api_key_env"])
-
-        elif provider == "deepseek":
-            conf = api_providers.get("deepseek")
-            return OpenAICompatibleClient(conf, conf["api_key_env"])
+        factory = _API_FACTORIES.get(provider)
+        if factory is not None:
+            conf = api_providers.get(provider)
+            return factory(conf, conf["api_key_env"])
 
         ollama_conf = local_providers.get("ollama", {})
         ollama_models = ollama_conf.get("models", {})
@@ -206,4 +775,8 @@ class LLMFactory:
 
             raise ValueError("For local models, please specify the alias (e.g., 'qwen_32b') not just 'ollama'.")
 
-        raise ValueError(f"Unknown LLM provider: {provider}")
\ No newline at end of file
+        raise ValueError(f"Unknown LLM provider: {provider}")
+
+    @staticmethod
+    def create_async_client(provider: str, config_path: str = "configs/settings.yaml", **kwargs) -> AsyncLLMClient:
+        return AsyncLLMClient(LLMFactory.create_client(provider, config_path, **kwargs))
\ No newline at end of file
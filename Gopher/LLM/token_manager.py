@@ -1,10 +1,19 @@
 import logging
 import math
-from typing import List, Dict, Optional, Tuple
+import functools
+from typing import List, Dict, Optional, Tuple, Sequence
 import tiktoken
 
 logger = logging.getLogger(__name__)
 
+@functools.lru_cache(maxsize=None)
+def _get_encoder(model_name: str):
+    try:
+        return tiktoken.encoding_for_model(model_name)
+    except KeyError:
+        logger.debug(f"No specific tokenizer found for {model_name}. Using cl100k_base proxy.")
+        return tiktoken.get_encoding("cl100k_base")
+
 class TokenManager:
     """Manages token counting and ensures prompts fit within LLM context windows."""
 
@@ -31,12 +40,7 @@ class TokenManager:
 
         self.model_name = model_name
         self.max_context_length = self._get_model_limit(model_name)
-
-        try:
-            self.encoder = tiktoken.encoding_for_model(model_name)
-        except KeyError:
-            logger.debug(f"No specific tokenizer found for {model_name}. Using cl100k_base proxy.")
-            self.encoder = tiktoken.get_encoding("cl100k_base")
+        self.encoder = _get_encoder(model_name)
 
     def _get_model_limit(self, model_name: str) -> int:
         for key, limit in self.MODEL_LIMITS.items():
@@ -47,6 +51,8 @@ class TokenManager:
     def count_tokens(self, text: str) -> int:
         if not text:
             return 0
+        if len(text) < 4 and text.isascii():
+            return len(text)  # Byte-level BPE never yields more tokens than bytes
         return len(self.encoder.encode(text))
 
     def check_fit(self, full_prompt: str) -> bool:
@@ -57,14 +63,35 @@ class TokenManager:
             return False
         return True
 
+    def check_fit_by_count(self, tokens: int) -> bool:
+        """`check_fit` for a prompt whose token count is already known, e.g. from `optimize_prompt`."""
+        limit = self.max_context_length - self.OUTPUT_RESERVE
+        if tokens > limit:
+            logger.warning(f"Prompt size {tokens} exceeds safe limit {limit} for {self.model_name}.")
+            return False
+        return True
+
     def optimize_prompt(self,
-                        static_parts: List[str],
+                        static_parts: Sequence[str],
                         dynamic_context: str,
-                        feedback_part: str = "") -> str:
-
-        static_text = "\n".join(static_parts)
-        feedback_tokens = self.count_tokens(feedback_part)
-        static_tokens = self.count_tokens(static_text)
+                        feedback_part: str = "",
+                        static_tokens: Optional[int] = None) -> Tuple[str, int]:
+        """
+        Fits `dynamic_context` into the budget left by the static parts and the feedback.
+        Pass `static_tokens` (the count for "\n".join(static_parts)) when the static parts are
+        reused across calls, so only the feedback has to be tokenized.
+
+        Returns the context and the token count of static parts + context + feedback, which
+        `check_fit_by_count` can test without re-encoding the assembled prompt.
+        """
+        if static_tokens is None:
+            static_tokens, feedback_tokens = map(
+                len, self.encoder.encode_batch(["\n".join(static_parts), feedback_part])
+            )
+        else:
+            feedback_tokens = self.count_tokens(feedback_part)
+        # The caller assembles the prompt with its own, untruncated feedback
+        prompt_feedback_tokens = feedback_tokens
 
         safe_limit = self.max_context_length - self.OUTPUT_RESERVE
         available_for_context = safe_limit - static_tokens - feedback_tokens
@@ -79,30 +106,73 @@ class TokenManager:
 
             if available_for_context < 0:
                 logger.error("Critical: Even without context and feedback, prompt is too long.")
-                return static_text
-
-        current_context_tokens = self.count_tokens(dynamic_context)
+                return "\n".join(static_parts), 2 * static_tokens + prompt_feedback_tokens
 
         final_context = dynamic_context
-        if current_context_tokens > available_for_context:
-            logger.info(f"Truncating context from {current_context_tokens} to {available_for_context} tokens.")
+        context_tokens = None
+        if self._estimate_tokens(dynamic_context) > available_for_context * 2:
+            # Clearly over budget: skip the exact count and let the bounded truncation do the work
+            logger.info(f"Truncating context of ~{self._estimate_tokens(dynamic_context)} to {available_for_context} tokens.")
             final_context = self._truncate_text(dynamic_context, available_for_context)
+        else:
+            context_tokens = self.count_tokens(dynamic_context)
+            if context_tokens > available_for_context:
+                logger.info(f"Truncating context from {context_tokens} to {available_for_context} tokens.")
+                final_context = self._truncate_text(dynamic_context, available_for_context)
+
+        if len(final_context) < len(dynamic_context):
             final_context += "\n... (Context truncated due to length) ..."
+            context_tokens = None
+
+        if context_tokens is None:
+            # Truncated contexts are at most the budget in size, so this count stays cheap
+            context_tokens = self.count_tokens(final_context)
 
-        return final_context
+        return final_context, static_tokens + context_tokens + prompt_feedback_tokens
+
+    @staticmethod
+    def _estimate_tokens(text: str) -> int:
+        # Cheap approximation (~4 chars per token for code); only used to pick a fast path
+        return len(text) >> 2
 
     def _truncate_text(self, text: str, max_tokens: int, from_end: bool = False) -> str:
 
         if max_tokens <= 0:
             return ""
 
-        tokens = self.encoder.encode(text)
-        if len(tokens) <= max_tokens:
-            return text
-
-        if from_end:
-            truncated_tokens = tokens[-max_tokens:]
-        else:
-            truncated_tokens = tokens[:max_tokens]
-
-        return self.encoder.decode(truncated_tokens)
\ No newline at end of file
+        # Short texts: a single full encode is cheapest
+        probe = max_tokens * 4
+        if len(text) <= probe:
+            tokens = self.encoder.encode(text)
+            if len(tokens) <= max_tokens:
+                return text
+
+            if from_end:
+                truncated_tokens = tokens[-max_tokens:]
+            else:
+                truncated_tokens = tokens[:max_tokens]
+
+            return self.encoder.decode(truncated_tokens)
+
+        # Large texts: only ever encode windows of roughly the budget size. Grow the window
+        # until it overflows, then bisect on the character boundary.
+        def window(n: int) -> str:
+            return text[-n:] if from_end else text[:n]
+
+        def fits(n: int) -> bool:
+            return len(self.encoder.encode(window(n))) <= max_tokens
+
+        lo, hi = 0, probe
+        while fits(hi):
+            if hi >= len(text):
+                return text
+            lo, hi = hi, min(hi * 2, len(text))
+
+        while hi - lo > 1:
+            mid = (lo + hi) // 2
+            if fits(mid):
+                lo = mid
+            else:
+                hi = mid
+
+        return window(lo)
\ No newline at end of file
@@ -1,17 +1,46 @@
 import os
+import json
+import time
+import hashlib
+import tempfile
+import atexit
+import socket
 import subprocess
+import threading
 import logging
-import yaml
+import orjson
+import requests
 import shutil
 from pathlib import Path
-from typing import Optional, Dict, Any, List
+from typing import Optional, Dict, Any, List, Union
 
 # Import core definitions
 from Gopher.core.artifact import BuggyArtifact
+from Gopher.core.config import load_yaml
 
 logger = logging.getLogger(__name__)
 
 
+def last_json_line(raw_output: str, opener: str = "[") -> Optional[Union[List, Dict]]:
+    # Joern prints its result after arbitrary log output, so walk lines backwards from the end
+    # of the buffer (without splitting all of it) and return the last one that parses as JSON.
+    if not raw_output:
+        return None
+
+    closer = "]" if opener == "[" else "}"
+    end = len(raw_output)
+    while end > 0:
+        start = raw_output.rfind("\n", 0, end) + 1
+        line = raw_output[start:end].strip()
+        if line.startswith(opener) and line.endswith(closer):
+            try:
+                return orjson.loads(line)
+            except orjson.JSONDecodeError:
+                pass
+        end = start - 1
+    return None
+
+
 class JoernBridge:
 
     def __init__(self, config_path: str = "configs/settings.yaml"):
@@ -21,6 +50,20 @@ class JoernBridge:
 
         self.joern_bin = self.joern_config.get("installation_path", "/usr/bin")
         self.jvm_opts = self.joern_config.get("java_opts", "-Xmx8g")
+        # Every joern-parse/export/script run is a JVM with the heap above; concurrent repair
+        # sessions and parallel slicing queue here (server queries reuse one running JVM)
+        self._jvm_slots = threading.BoundedSemaphore(max(1, self.joern_config.get("max_parallel_jvms", 2)))
+
+        # Optional long-running `joern --server` so query scripts skip JVM startup per call
+        server_cfg = self.joern_config.get("server", {})
+        self.server_enabled = server_cfg.get("enabled", False)
+        self.server_host = server_cfg.get("host", "localhost")
+        self.server_port = server_cfg.get("port", 8080)
+        self.server_entrypoint = server_cfg.get("entrypoint", "exec")
+        self._server_proc: Optional[subprocess.Popen] = None
+        self._server_lock = threading.Lock()
+        # The server is one REPL: importCpg swaps its global `cpg`, so queries must not interleave
+        self._query_lock = threading.Lock()
 
         self._check_installation()
 
@@ -28,8 +71,7 @@ class JoernBridge:
         if not os.path.exists(path):
             logger.warning(f"Config file not found at {path}, using defaults.")
             return {}
-        with open(path, 'r') as f:
-            return yaml.safe_load(f)
+        return load_yaml(path)
 
     def _check_installation(self):
         # Check specific commands we need
@@ -43,13 +85,26 @@ class JoernBridge:
             else:
                 logger.warning(f"Joern command '{parse_cmd}' not found in PATH or {self.joern_bin}. Analysis may fail.")
 
-    def generate_cpg(self, artifact: BuggyArtifact, output_dir: str) -> str:
+    def generate_cpg(self, artifact: BuggyArtifact, output_dir: str, cache_dir: Optional[str] = None) -> str:
+        """
+        Parses the artifact's source directory into `output_dir/cpg.bin`. With `cache_dir`, CPGs are
+        also kept there keyed by the parsed sources and the Joern install, and a hit skips joern-parse.
+        """
+        project_root = str(Path(artifact.file_path).parent)  # This might need adjustment based on dataset structure
+
+        cache_key = None
+        if cache_dir:
+            cache_key = self._cpg_cache_key(project_root, artifact)
+            cached_path = os.path.join(cache_dir, cache_key, "cpg.bin")
+            # meta.json is written last, so its presence marks a complete entry
+            if os.path.exists(os.path.join(cache_dir, cache_key, "meta.json")) and os.path.exists(cached_path):
+                logger.info(f"Reusing cached CPG for {artifact.identifier}: {cached_path}")
+                return cached_path
+
         os.makedirs(output_dir, exist_ok=True)
 
         cpg_path = os.path.join(output_dir, "cpg.bin")
 
-        project_root = str(Path(artifact.file_path).parent)  # This might need adjustment based on dataset structure
-
         logger.info(f"Generating CPG for project at: {project_root}")
 
         cmd = [
@@ -65,12 +120,15 @@ class JoernBridge:
         timeout = self.joern_config.get("timeouts", {}).get("cpg_generation", 600)
 
         try:
-            self._run_command(cmd, env=env, timeout=timeout)
+            with self._jvm_slots:
+                self._run_command(cmd, env=env, timeout=timeout)
 
             if not os.path.exists(cpg_path):
                 raise RuntimeError(f"CPG file was not created at {cpg_path}")
 
             logger.info(f"CPG successfully generated at {cpg_path}")
+            if cache_key is not None:
+                self._store_cached_cpg(cpg_path, cache_dir, cache_key)
             return cpg_path
 
         except subprocess.TimeoutExpired:
@@ -80,6 +138,41 @@ class JoernBridge:
             logger.error(f"Joern parse failed: {e.stderr}")
             raise RuntimeError("Joern parse command failed.") from e
 
+    def _analyzer_fingerprint(self) -> str:
+        # Path and mtime of the parse executable change whenever Joern is upgraded or moved
+        parse_cmd = self.joern_config.get("parse_command", "joern-parse")
+        exe = shutil.which(parse_cmd) or shutil.which(os.path.join(self.joern_bin, parse_cmd))
+        if exe is None:
+            return parse_cmd
+        exe = os.path.realpath(exe)
+        return f"{exe}:{os.path.getmtime(exe)}"
+
+    def _cpg_cache_key(self, project_root: str, artifact: BuggyArtifact) -> str:
+        # joern-parse reads every source file under the directory, not just the buggy one
+        suffix = Path(artifact.file_path).suffix
+        digest = hashlib.sha256()
+        digest.update(f"{artifact.language}\0{self._analyzer_fingerprint()}\0".encode('utf-8'))
+        for path in sorted(Path(project_root).rglob(f"*{suffix}")):
+            digest.update(path.relative_to(project_root).as_posix().encode('utf-8') + b"\0")
+            digest.update(path.read_bytes() + b"\0")
+        return digest.hexdigest()
+
+    def _store_cached_cpg(self, cpg_path: str, cache_dir: str, cache_key: str):
+        entry_dir = os.path.join(cache_dir, cache_key)
+        try:
+            os.makedirs(cache_dir, exist_ok=True)
+            tmp_dir = tempfile.mkdtemp(prefix=f".{cache_key}.", dir=cache_dir)
+            shutil.copy2(cpg_path, os.path.join(tmp_dir, "cpg.bin"))
+            with open(os.path.join(tmp_dir, "meta.json"), 'wb') as f:
+                f.write(orjson.dumps({"joern": self._analyzer_fingerprint(), "created": time.time()}))
+            try:
+                # Publish the entry in one rename; a concurrent writer that got there first wins
+                os.rename(tmp_dir, entry_dir)
+            except OSError:
+                shutil.rmtree(tmp_dir, ignore_errors=True)
+        except OSError as e:
+            logger.warning(f"Could not cache CPG {cpg_path}: {e}")
+
     def generate_graph_representations(self, cpg_path: str, output_dir: str):
         export_cmd = self.joern_config.get("export_command", "joern-export")
 
@@ -97,13 +190,14 @@ class JoernBridge:
 
             try:
                 logger.info(f"Exporting {repr_type} graph to {out_file}...")
-                self._run_command(cmd, timeout=300)
+                with self._jvm_slots:
+                    self._run_command(cmd, timeout=300)
             except Exception as e:
                 logger.warning(f"Failed to export {repr_type}: {e}")
 
     def execute_query_script(self, cpg_path: str, script_path: str, params: Dict[str, str] = None) -> str:
-        if params is None:
-            params = {}
+        # Copy so concurrent callers sharing one params dict don't race on it
+        params = dict(params) if params else {}
 
         params["cpgFile"] = cpg_path
         param_args = []
@@ -120,11 +214,106 @@ class JoernBridge:
 
         timeout = self.joern_config.get("timeouts", {}).get("script_execution", 300)
 
+        if self._ensure_server():
+            logger.info(f"Executing Scala script on Joern server: {script_path} with params {params}")
+            try:
+                return self._query_server(script_path, params, timeout)
+            except (requests.exceptions.RequestException, RuntimeError) as e:
+                logger.warning(f"Joern server query failed ({e}). Falling back to a one-off Joern process.")
+
         logger.info(f"Executing Scala script: {script_path} with params {params}")
 
-        result = self._run_command(cmd, env=env, timeout=timeout, capture_output=True)
+        with self._jvm_slots:
+            result = self._run_command(cmd, env=env, timeout=timeout, capture_output=True)
         return result.stdout
 
+    def _ensure_server(self) -> bool:
+        if not self.server_enabled:
+            return False
+
+        with self._server_lock:
+            if self._server_proc is not None and self._server_proc.poll() is None:
+                return True
+
+            if self._server_proc is not None:
+                logger.warning(f"Joern server exited with code {self._server_proc.returncode}. Restarting...")
+
+            cli = self.joern_config.get("cli_command", "joern")
+            cli_path = shutil.which(cli) or os.path.join(self.joern_bin, cli)
+            if not os.path.exists(cli_path):
+                logger.warning(f"Joern CLI '{cli}' not found. Using subprocess mode for query scripts.")
+                self.server_enabled = False
+                return False
+
+            env = os.environ.copy()
+            env["JAVA_OPTS"] = self.jvm_opts
+
+            logger.info(f"Starting Joern server on {self.server_host}:{self.server_port}...")
+            self._server_proc = subprocess.Popen(
+                [cli_path, "--server", "--server-host", self.server_host, "--server-port", str(self.server_port)],
+                env=env,
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL
+            )
+
+            startup_timeout = self.joern_config.get("timeouts", {}).get("server_startup", 120)
+            if not self._wait_for_server(startup_timeout):
+                logger.warning(f"Joern server not ready after {startup_timeout}s. Using subprocess mode for query scripts.")
+                self._stop_server()
+                self.server_enabled = False
+                return False
+
+            atexit.register(self.close)
+            return True
+
+    def _wait_for_server(self, timeout: float) -> bool:
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            if self._server_proc.poll() is not None:
+                return False
+            try:
+                with socket.create_connection((self.server_host, self.server_port), timeout=1):
+                    return True
+            except OSError:
+                time.sleep(0.5)
+        return False
+
+    def _query_server(self, script_path: str, params: Dict[str, str], timeout: int) -> str:
+        with open(script_path, 'r', encoding='utf-8') as f:
+            script = f.read()
+
+        # Same contract as `--param k=v`: the script's @main entry point receives named String arguments
+        args = ", ".join(f"{k} = {json.dumps(str(v))}" for k, v in params.items())
+        query = f"{script}\n{self.server_entrypoint}({args})"
+
+        with self._query_lock:
+            response = requests.post(
+                f"http://{self.server_host}:{self.server_port}/query-sync",
+                json={"query": query},
+                timeout=timeout
+            )
+        response.raise_for_status()
+
+        data = response.json()
+        if not data.get("success", False):
+            raise RuntimeError(f"Joern server reported failure: {data.get('stderr') or data}")
+        return data.get("stdout", "")
+
+    def _stop_server(self):
+        proc = self._server_proc
+        self._server_proc = None
+        if proc is None or proc.poll() is not None:
+            return
+        proc.terminate()
+        try:
+            proc.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+
+    def close(self):
+        with self._server_lock:
+            self._stop_server()
+
     def _run_command(self, cmd: List[str], env: Dict = None, timeout: int = 600, capture_output: bool = False):
 
         if env is None:
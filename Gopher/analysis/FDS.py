@@ -1,9 +1,9 @@
-import json
 import logging
+from concurrent.futures import ThreadPoolExecutor
 from typing import List, Dict, Tuple, Optional, Set
 
 from Gopher.core.artifact import BuggyArtifact
-from Gopher.analysis.CPG_joern import JoernBridge
+from Gopher.analysis.CPG_joern import JoernBridge, last_json_line
 
 logger = logging.getLogger(__name__)
 
@@ -36,19 +36,16 @@ class FocusedSlicer:
         else:
             logger.warning(f"Method name missing for bug {artifact.buggy_id}. Slicing based on line number only.")
 
-        ddg_lines = self._run_slicing_strategy(
-            cpg_path,
-            self.ddg_script_path,
-            params,
-            slice_type="Data"
-        )
-
-        cdg_lines = self._run_slicing_strategy(
-            cpg_path,
-            self.cdg_script_path,
-            params,
-            slice_type="Control"
-        )
+        # The two Joern invocations are independent, so run them side by side
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            ddg_future = executor.submit(
+                self._run_slicing_strategy, cpg_path, self.ddg_script_path, params, "Data"
+            )
+            cdg_future = executor.submit(
+                self._run_slicing_strategy, cpg_path, self.cdg_script_path, params, "Control"
+            )
+            ddg_lines = ddg_future.result()
+            cdg_lines = cdg_future.result()
 
         source_code_lines = artifact.source_code.splitlines()
 
@@ -82,18 +79,11 @@ class FocusedSlicer:
 
         if not raw_output:
             return set()
-        lines = raw_output.strip().splitlines()
-
-        for line in reversed(lines):
-            line = line.strip()
-            if line.startswith('[') and line.endswith(']'):
-                try:
-                    data = json.loads(line)
-                    if isinstance(data, list):
-                        # Convert to unique set of integers, filter out Nones
-                        return {int(x) for x in data if x is not None}
-                except json.JSONDecodeError:
-                    continue
+
+        data = last_json_line(raw_output)
+        if isinstance(data, list):
+            # Convert to unique set of integers, filter out Nones
+            return {int(x) for x in data if x is not None}
 
         # logger.warning("Could not find valid JSON list in Joern output.")
         logger.debug(f"Raw Output: {raw_output}")
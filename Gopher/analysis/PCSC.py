@@ -1,12 +1,14 @@
 import logging
-import json
+import re
 from typing import List, Dict, Set, Optional
 
 from Gopher.core.artifact import BuggyArtifact
-from Gopher.analysis.CPG_joern import JoernBridge
+from Gopher.analysis.CPG_joern import JoernBridge, last_json_line
 
 logger = logging.getLogger(__name__)
 
+_INDENT_RE = re.compile(r"[ \t]*")
+
 class PeripheralContextExtractor:
 
     def __init__(self, joern_bridge: JoernBridge):
@@ -51,25 +53,22 @@ class PeripheralContextExtractor:
         if not raw_output:
             return ranges
 
-        lines = raw_output.strip().splitlines()
-        for line in reversed(lines):
-            line = line.strip()
-            if line.startswith('[') and line.endswith(']'):
-                try:
-                    data = json.loads(line)
-                    if isinstance(data, list):
-                        for item in data:
-                            start = item.get("startLine") or item.get("start")
-                            end = item.get("endLine") or item.get("end")
-                            if start and end:
-                                ranges.append({"start": int(start), "end": int(end)})
-                        return ranges
-                except json.JSONDecodeError:
-                    continue
+        data = last_json_line(raw_output)
+        if isinstance(data, list):
+            return self._normalize_ranges(data)
 
         logger.warning("No valid JSON ranges found in Joern output for skeleton generation.")
         return ranges
 
+    def _normalize_ranges(self, data: List[Dict]) -> List[Dict[str, int]]:
+        ranges = []
+        for item in data:
+            start = item.get("startLine") or item.get("start")
+            end = item.get("endLine") or item.get("end")
+            if start and end:
+                ranges.append({"start": int(start), "end": int(end)})
+        return ranges
+
     def _create_skeleton(self, source_code: str, ranges_to_hide: List[Dict[str, int]]) -> str:
 
         if not ranges_to_hide:
@@ -77,8 +76,9 @@ class PeripheralContextExtractor:
 
         lines = source_code.splitlines()
 
-        lines_to_suppress = set()
-        placeholder_insertion_points = {}
+        is_suppressed = bytearray(len(lines))
+        # 0-based line index -> True for lines that are followed by a collapsed-block placeholder
+        placeholder_at: Dict[int, bool] = {}
 
         for rng in ranges_to_hide:
             start = rng["start"]
@@ -86,26 +86,22 @@ class PeripheralContextExtractor:
 
             # if end >= start:
             if end > start:
-                for i in range(start + 1, end):
-                    lines_to_suppress.add(i - 1)
+                for idx in range(max(start, 0), min(end - 1, len(lines))):
+                    is_suppressed[idx] = 1
 
-                if start + 1 < end:
-                    placeholder_insertion_points[start] = True
+                placeholder_at[start - 1] = True
 
         result_lines = []
         for i, line in enumerate(lines):
-            if i in lines_to_suppress:
+            if is_suppressed[i]:
                 continue
             result_lines.append(line)
 
-            for rng in ranges_to_hide:
-                if (i == rng["start"] - 1) and (rng["end"] > rng["start"]):
-                    indent = ""
-                    if i + 1 < len(lines):
-                        next_line = lines[i + 1]
-                        indent = next_line[:len(next_line) - len(next_line.lstrip())]
+            if i in placeholder_at:
+                indent = ""
+                if i + 1 < len(lines):
+                    indent = _INDENT_RE.match(lines[i + 1]).group(0)
 
-                    result_lines.append(f"{indent}# ... existing code ...")
-                    break
+                result_lines.append(f"{indent}# ... existing code ...")
 
         return "\n".join(result_lines)
\ No newline at end of file
@@ -1,13 +1,18 @@
+import os
 import logging
-from typing import Set, List, Dict
+import re
+from concurrent.futures import ThreadPoolExecutor
+from typing import Set, List, Dict, Optional, Any
 
 from Gopher.core.artifact import BuggyArtifact
-from Gopher.analysis.CPG_joern import JoernBridge
+from Gopher.analysis.CPG_joern import JoernBridge, last_json_line
 from Gopher.analysis.FDS import FocusedSlicer
 from Gopher.analysis.PCSC import PeripheralContextExtractor
 
 logger = logging.getLogger(__name__)
 
+_INDENT_RE = re.compile(r"[ \t]*")
+
 
 class ContextBuilder:
 
@@ -16,6 +21,11 @@ class ContextBuilder:
         self.slicer = FocusedSlicer(joern_bridge)
         self.periphery = PeripheralContextExtractor(joern_bridge)
 
+        # One script that loads the CPG once and emits DDG, CDG and skeleton ranges together
+        self.combined_script = self.joern.config.get("joern", {}).get("scripts", {}).get(
+            "combined_context", "./Gopher/analysis/scala/combined_context.sc"
+        )
+
     def build_mixed_context(self, cpg_path: str, artifact: BuggyArtifact) -> str:
 
         if not cpg_path:
@@ -29,40 +39,79 @@ class ContextBuilder:
         if artifact.method_name:
             slice_params["methodName"] = artifact.method_name
 
-        ddg_lines = self.slicer._run_slicing_strategy(
-            cpg_path, self.slicer.ddg_script_path, slice_params, "Data"
-        )
-        cdg_lines = self.slicer._run_slicing_strategy(
-            cpg_path, self.slicer.cdg_script_path, slice_params, "Control"
-        )
+        payload = self._run_combined_query(cpg_path, slice_params)
+        if payload is not None:
+            slice_lines_set = {int(x) for x in payload.get("ddg", []) if x is not None}
+            slice_lines_set.update(int(x) for x in payload.get("cdg", []) if x is not None)
+            slice_lines_set.add(artifact.buggy_line_no)
+
+            ranges_to_hide = self.periphery._normalize_ranges(payload.get("ranges", []))
+            return self._stitch_code(artifact.source_code, slice_lines_set, ranges_to_hide)
+
+        periphery_params = {"filename": artifact.file_path}
+
+        with ThreadPoolExecutor(max_workers=3) as executor:
+            ddg_future = executor.submit(
+                self.slicer._run_slicing_strategy, cpg_path, self.slicer.ddg_script_path, slice_params, "Data"
+            )
+            cdg_future = executor.submit(
+                self.slicer._run_slicing_strategy, cpg_path, self.slicer.cdg_script_path, slice_params, "Control"
+            )
+            ast_future = executor.submit(
+                self.joern.execute_query_script, cpg_path, self.periphery.skeleton_script, periphery_params
+            )
+
+            ddg_lines = ddg_future.result()
+            cdg_lines = cdg_future.result()
+            raw_ast_output = ast_future.result()
 
         slice_lines_set = ddg_lines.union(cdg_lines)
         slice_lines_set.add(artifact.buggy_line_no)
 
-        periphery_params = {"filename": artifact.file_path}
-        raw_ast_output = self.joern.execute_query_script(
-            cpg_path, self.periphery.skeleton_script, periphery_params
-        )
         ranges_to_hide = self.periphery._parse_ranges(raw_ast_output)
 
         return self._stitch_code(artifact.source_code, slice_lines_set, ranges_to_hide)
 
+    def _run_combined_query(self, cpg_path: str, params: Dict[str, str]) -> Optional[Dict[str, Any]]:
+
+        if not self.combined_script or not os.path.exists(self.combined_script):
+            return None
+
+        try:
+            raw_output = self.joern.execute_query_script(cpg_path, self.combined_script, params)
+        except Exception as e:
+            logger.warning(f"Combined context query failed ({e}). Falling back to per-phase queries.")
+            return None
+
+        data = last_json_line(raw_output, opener="{")
+        if isinstance(data, dict) and "ddg" in data:
+            return data
+
+        logger.warning("No JSON payload found in combined context output. Falling back to per-phase queries.")
+        return None
+
     def _stitch_code(self, source_code: str, slice_lines: Set[int], ranges_to_hide: List[Dict[str, int]]) -> str:
 
         lines = source_code.splitlines()
         stitched_lines = []
 
-        is_suppressible = [False] * len(lines)
+        # Line numbers are small dense ints, so byte masks beat set/list lookups in the loop below
+        is_slice = bytearray(len(lines) + 2)
+        for line_num in slice_lines:
+            if 0 <= line_num < len(is_slice):
+                is_slice[line_num] = 1
+
+        is_suppressible = bytearray(len(lines))
 
         for rng in ranges_to_hide:
             start = rng["start"]
             end = rng["end"]
 
             if end > start:
-                for i in range(start + 1, end):  # 1-based logic from Joern
-                    idx = i - 1  # 0-based
-                    if 0 <= idx < len(lines):
-                        is_suppressible[idx] = True
+                # 1-based lines start+1 .. end-1 from Joern -> 0-based indices start .. end-2
+                lo, hi = max(start, 0), min(end - 1, len(lines))
+                if hi > lo:
+                    is_suppressible[lo:hi] = b"\x01" * (hi - lo)
 
         last_was_gap = False
 
@@ -73,7 +122,7 @@ class ContextBuilder:
 
             if is_suppressible[i]:
 
-                if line_num in slice_lines:
+                if is_slice[line_num]:
                     should_keep = True
                 else:
                     should_keep = False
@@ -83,7 +132,7 @@ class ContextBuilder:
                 last_was_gap = False
             else:
                 if not last_was_gap:
-                    indent = line_content[:len(line_content) - len(line_content.lstrip())]
+                    indent = _INDENT_RE.match(line_content).group(0)
                     stitched_lines.append(f"{indent}# ... (irrelevant code hidden)")
                     last_was_gap = True
 
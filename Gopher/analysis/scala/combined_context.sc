@@ -0,0 +1,60 @@
+// Combined context query for ContextBuilder.build_mixed_context.
+// Loads the CPG once and prints a single JSON line:
+//   {"ddg": [lines...], "cdg": [lines...], "ranges": [{"startLine": s, "endLine": e}, ...]}
+// ddg/cdg follow the data_dependency.sc / control_dependency.sc contract (line numbers related to
+// the buggy line inside its method); ranges follow ast_structure.sc (method bodies in the file).
+
+import io.shiftleft.codepropertygraph.generated.nodes.CfgNode
+import io.shiftleft.semanticcpg.language._
+
+import scala.collection.mutable
+
+@main def exec(cpgFile: String, filename: String, lineNumber: String, methodName: String = "") = {
+  importCpg(cpgFile)
+
+  val line = lineNumber.toInt
+
+  def inFile(path: String): Boolean =
+    path == filename || filename.endsWith(path) || path.endsWith(filename)
+
+  val fileMethods = cpg.method.isExternal(false).filter(m => inFile(m.filename)).l
+
+  val enclosing = fileMethods.filter { m =>
+    m.lineNumber.exists(_ <= line) && m.lineNumberEnd.exists(_ >= line)
+  }
+  val targetMethod = enclosing.find(_.name == methodName).orElse(enclosing.sortBy(m => m.lineNumberEnd.get - m.lineNumber.get).headOption)
+
+  val seeds: List[CfgNode] = targetMethod.toList.flatMap(_.cfgNode.lineNumber(line).l)
+
+  // Transitive closure over DDG edges in both directions, kept inside the target method
+  val ddgNodes = mutable.Set[CfgNode]()
+  val worklist = mutable.Queue[CfgNode](seeds: _*)
+  while (worklist.nonEmpty) {
+    val node = worklist.dequeue()
+    if (ddgNodes.add(node)) {
+      (node.ddgIn.l ++ node.ddgOut.l)
+        .filter(n => targetMethod.contains(n.method))
+        .foreach(worklist.enqueue(_))
+    }
+  }
+  val ddgLines = ddgNodes.flatMap(_.lineNumber).map(_.toInt).toSeq.sorted.distinct
+
+  val cdgLines = seeds
+    .flatMap(n => n.controlledBy.l ++ n.controls.l)
+    .flatMap(_.lineNumber)
+    .map(_.toInt)
+    .sorted
+    .distinct
+
+  val ranges = fileMethods
+    .filter(m => m.lineNumber.isDefined && m.lineNumberEnd.exists(end => end > m.lineNumber.get))
+    .map(m => (m.lineNumber.get.toInt, m.lineNumberEnd.get.toInt))
+    .distinct
+    .sorted
+
+  val ddgJson = ddgLines.mkString("[", ",", "]")
+  val cdgJson = cdgLines.mkString("[", ",", "]")
+  val rangesJson = ranges.map { case (s, e) => s"""{"startLine":$s,"endLine":$e}""" }.mkString("[", ",", "]")
+
+  println(s"""{"ddg":$ddgJson,"cdg":$cdgJson,"ranges":$rangesJson}""")
+}
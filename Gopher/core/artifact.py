@@ -2,7 +2,10 @@ import os
 from dataclasses import dataclass, field
 from typing import Optional, List, Dict
 
-@dataclass
+from Gopher.core.compat import add_slots
+
+@add_slots
+@dataclass(frozen=True)
 class BuggyArtifact:
 
     project_name: str
@@ -17,7 +20,8 @@ class BuggyArtifact:
     def identifier(self) -> str:
         return f"{self.project_name}-{self.bug_id}"
 
-@dataclass
+@add_slots
+@dataclass(frozen=True)
 class DualLayerContext:
     """
     Layer 1 && Layer 2
@@ -29,6 +33,7 @@ class DualLayerContext:
     def is_empty(self) -> bool:
         return not (self.data_dependency_slice or self.peripheral_context)
 
+@add_slots
 @dataclass
 class RepairSession:
 
@@ -0,0 +1,37 @@
+from dataclasses import fields
+
+
+def _getstate(self):
+    return [getattr(self, f.name) for f in fields(self)]
+
+
+def _setstate(self, state):
+    for f, value in zip(fields(self), state):
+        # object.__setattr__ also works on frozen instances
+        object.__setattr__(self, f.name, value)
+
+
+def add_slots(cls):
+    """
+    Rebuilds a dataclass with `__slots__` for its fields, like `@dataclass(slots=True)`
+    (Python 3.10+). Apply it on top of `@dataclass`.
+    """
+    field_names = tuple(f.name for f in fields(cls))
+
+    cls_dict = dict(cls.__dict__)
+    cls_dict["__slots__"] = field_names
+    for name in field_names:
+        # Defaults live in the generated __init__; the class attributes would clash with the slots
+        cls_dict.pop(name, None)
+    cls_dict.pop("__dict__", None)
+    cls_dict.pop("__weakref__", None)
+
+    new_cls = type(cls)(cls.__name__, cls.__bases__, cls_dict)
+    new_cls.__qualname__ = cls.__qualname__
+
+    if cls.__dataclass_params__.frozen:
+        # Frozen slotted instances cannot be restored through setattr by pickle/copy
+        new_cls.__getstate__ = _getstate
+        new_cls.__setstate__ = _setstate
+
+    return new_cls
@@ -0,0 +1,25 @@
+import os
+import functools
+from typing import Dict, Any
+
+import yaml
+
+try:
+    from yaml import CSafeLoader as _SafeLoader  # libyaml C backend
+except ImportError:
+    from yaml import SafeLoader as _SafeLoader
+
+
+@functools.lru_cache(maxsize=None)
+def _load_yaml_cached(path: str, mtime: float) -> Dict[str, Any]:
+    with open(path, 'r', encoding='utf-8') as f:
+        return yaml.load(f, Loader=_SafeLoader) or {}
+
+
+def load_yaml(path: str) -> Dict[str, Any]:
+    """
+    Parses a YAML config once per process. The cache is keyed on the absolute path and the
+    file's mtime, so edits on disk are picked up. The returned dict is shared: treat it as read-only.
+    """
+    abs_path = os.path.abspath(path)
+    return _load_yaml_cached(abs_path, os.path.getmtime(abs_path))
@@ -11,11 +11,14 @@ from .patch import (
     CandidatePatch
 )
 
+from .config import load_yaml
+
 __all__ = [
     "BuggyArtifact",
     "DualLayerContext",
     "RepairSession",
     "PatchStatus",
     "TestResult",
-    "CandidatePatch"
+    "CandidatePatch",
+    "load_yaml"
 ]
\ No newline at end of file
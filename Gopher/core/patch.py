@@ -1,7 +1,10 @@
 from enum import Enum
 from dataclasses import dataclass, field
+from hashlib import blake2b
 from typing import Optional
 
+from Gopher.core.compat import add_slots
+
 class PatchStatus(Enum):
 
     GENERATED = "GENERATED"  # Patch just created by LLM
@@ -11,7 +14,8 @@ class PatchStatus(Enum):
     TIMEOUT = "TIMEOUT"  # Execution took too long
 
 
-@dataclass
+@add_slots
+@dataclass(frozen=True)
 class TestResult:
     """Captures the output of the execution/testing module."""
     passed: bool
@@ -27,6 +31,7 @@ class TestResult:
             f"Failed Test Case: {self.failed_test_name}"
         )
 
+@add_slots
 @dataclass
 class CandidatePatch:
 
@@ -38,9 +43,24 @@ class CandidatePatch:
     diff: str = ""
     status: PatchStatus = PatchStatus.GENERATED
     test_result: Optional[TestResult] = None
+    # default_factory so __init__ assigns it even though it is not an init argument (required with __slots__)
+    _code_hash: str = field(default_factory=str, init=False, repr=False, compare=False)
+    _identifier: str = field(default_factory=str, init=False, repr=False, compare=False)
 
     def is_plausible(self) -> bool:
         return self.status == PatchStatus.PLAUSIBLE
 
+    @property
+    def code_hash(self) -> str:
+        # Stable across processes (unlike the salted built-in hash()), computed once per patch
+        if not self._code_hash:
+            self._code_hash = blake2b(self.cleaned_code.encode("utf-8"), digest_size=8).hexdigest()
+        return self._code_hash
+
     def get_identifier(self) -> str:
-        return f"{self.bug_id}_{self.llm_model}_round{self.round_number}_{hash(self.cleaned_code)}"
\ No newline at end of file
+        # Built once; used as a key when sorting/deduplicating candidate lists
+        if not self._identifier:
+            self._identifier = "_".join(
+                (str(self.bug_id), self.llm_model, f"round{self.round_number}", self.code_hash)
+            )
+        return self._identifier
\ No newline at end of file
@@ -1,12 +1,77 @@
 import numpy as np
 import pandas as pd
-import math
 import argparse
 import sys
 
+try:
+    from numba import njit, prange
+    _HAS_NUMBA = True
+except ImportError:
+    _HAS_NUMBA = False
+
+
+if _HAS_NUMBA:
+
+    @njit(inline="always")
+    def _popcount64(x):
+        # SWAR bit count; LLVM lowers this to a single POPCNT where the CPU has it
+        x = x - ((x >> np.uint64(1)) & np.uint64(0x5555555555555555))
+        x = (x & np.uint64(0x3333333333333333)) + ((x >> np.uint64(2)) & np.uint64(0x3333333333333333))
+        x = (x + (x >> np.uint64(4))) & np.uint64(0x0F0F0F0F0F0F0F0F)
+        return (x * np.uint64(0x0101010101010101)) >> np.uint64(56)
+
+    @njit(parallel=True, cache=True)
+    def _ochiai_jit(packed_cov, fail_mask, pass_mask, ef_out, ep_out):
+        # packed_cov: one row of uint64 words per statement, one bit per test
+        num_stmts, num_words = packed_cov.shape
+        for s in prange(num_stmts):
+            ef = np.uint64(0)
+            ep = np.uint64(0)
+            for w in range(num_words):
+                bits = packed_cov[s, w]
+                ef += _popcount64(bits & fail_mask[w])
+                ep += _popcount64(bits & pass_mask[w])
+            ef_out[s] = ef
+            ep_out[s] = ep
+
+
+def _pack_bits64(bits):
+    # Packs a boolean array along its last axis into little-endian uint64 words
+    packed = np.packbits(bits, axis=-1, bitorder="little")
+    pad = -packed.shape[-1] % 8
+    if pad:
+        packed = np.pad(packed, [(0, 0)] * (packed.ndim - 1) + [(0, pad)])
+    return np.ascontiguousarray(packed).view(np.uint64)
+
+
+def _ochiai_counts_jit(covered, outcomes):
+    # Bit-packed coverage: one bit per cell instead of 4-8 bytes
+    num_stmts = covered.shape[1]
+    packed_cov = _pack_bits64(covered.T)
+    fail_mask = _pack_bits64(outcomes == 1)
+    pass_mask = _pack_bits64(outcomes == 0)
+
+    ef = np.empty(num_stmts, dtype=np.int64)
+    ep = np.empty(num_stmts, dtype=np.int64)
+    _ochiai_jit(packed_cov, fail_mask, pass_mask, ef, ep)
+    return ef, ep
+
+
+def _ochiai_counts_blas(covered, outcomes):
+    # Both outcome masks in one float32 GEMM: the coverage matrix is streamed once at 4 bytes
+    # per cell through BLAS (counts stay exact below 2**24 tests)
+    masks = np.stack([outcomes == 1, outcomes == 0]).astype(np.float32)
+    ef, ep = np.rint(masks @ covered.astype(np.float32)).astype(np.int64)
+    return ef, ep
+
 def ochiai(coverage, outcomes, stmt_names=None):
+    """
+    Ochiai suspiciousness per statement. `coverage` is tests x statements; any nonzero cell
+    counts as "covered", so hit-count matrices give ef/ep as numbers of tests, the same as
+    ochiai_from_sets. (Earlier versions summed hit counts into ef/ep instead.)
+    """
 
-    cov = np.asarray(coverage, dtype=int)
+    cov = np.asarray(coverage)
     outcomes = np.asarray(outcomes, dtype=int)
     num_tests, num_stmts = cov.shape
 
@@ -19,16 +84,21 @@ def ochiai(coverage, outcomes, stmt_names=None):
         raise ValueError("Length of stmt_names must match number of statements")
 
     F = int(np.sum(outcomes == 1))
-    ef = np.dot(outcomes == 1, cov)
-    ep = np.dot(outcomes == 0, cov)
+    # Ochiai counts tests, not hits: any nonzero cell (e.g. a hit count) means "covered"
+    covered = cov != 0
+    counts = _ochiai_counts_jit if _HAS_NUMBA else _ochiai_counts_blas
+    ef, ep = counts(covered, outcomes)
+
+    return _ochiai_table(ef, ep, F, stmt_names)
+
 
+def _ochiai_table(ef, ep, F, stmt_names):
+
+    num_stmts = len(stmt_names)
+    denom = F * (ef + ep).astype(np.float64)
     scores = np.zeros(num_stmts, dtype=float)
-    for i in range(num_stmts):
-        denom = F * (ef[i] + ep[i])
-        if F == 0 or denom == 0:
-            scores[i] = 0.0
-        else:
-            scores[i] = ef[i] / math.sqrt(denom)
+    if F > 0:
+        np.divide(ef, np.sqrt(denom), out=scores, where=denom > 0)
 
     df = pd.DataFrame({
         "stmt": stmt_names,
@@ -58,11 +128,19 @@ def ochiai_from_sets(test_exec_sets, failing_tests, stmt_universe=None):
     stmt_universe = list(stmt_universe)
     idx = {s: i for i, s in enumerate(stmt_universe)}
 
-    cov = np.zeros((n, len(stmt_universe)), dtype=int)
-    for t, executed in enumerate(test_exec_sets):
-        for s in executed:
-            cov[t, idx[s]] = 1
-    return ochiai(cov, failures_bool, stmt_names=stmt_universe)
+    # Aggregate (test, stmt) hits directly instead of materializing a dense n x S matrix
+    num_stmts = len(stmt_universe)
+    lengths = [len(executed) for executed in test_exec_sets]
+    stmt_idx = np.fromiter((idx[s] for executed in test_exec_sets for s in executed),
+                           dtype=np.int64, count=sum(lengths))
+    test_idx = np.repeat(np.arange(n), lengths)
+
+    fail_mask = np.asarray(failures_bool, dtype=bool)
+    hit_failing = fail_mask[test_idx]
+    ef = np.bincount(stmt_idx[hit_failing], minlength=num_stmts)
+    ep = np.bincount(stmt_idx[~hit_failing], minlength=num_stmts)
+
+    return _ochiai_table(ef, ep, int(fail_mask.sum()), stmt_universe)
 
 def main_FL():
     parser = argparse.ArgumentParser(description="Ochiai Fault Localization")
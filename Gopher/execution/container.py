@@ -1,9 +1,13 @@
 import docker
 import logging
-import os
+import posixpath
+import json
+import hashlib
+import atexit
 import tarfile
 import io
 import time
+import threading
 from typing import Optional, Tuple, Dict, List
 from contextlib import contextmanager
 from docker.errors import DockerException, APIError
@@ -14,13 +18,175 @@ class ContainerExecutionError(Exception):
     """Raised when a container operation fails."""
     pass
 
+class _IterReader:
+    """Minimal file-like view over an iterator of byte chunks, for streaming tarfile reads."""
+
+    def __init__(self, chunks):
+        self._chunks = iter(chunks)
+        self._chunk = b""
+        self._pos = 0
+
+    def read(self, size: int = -1) -> bytes:
+        parts = []
+        while size != 0:
+            if self._pos >= len(self._chunk):
+                chunk = next(self._chunks, None)
+                if chunk is None:
+                    break
+                self._chunk, self._pos = chunk, 0
+                continue
+
+            end = len(self._chunk) if size < 0 else min(len(self._chunk), self._pos + size)
+            parts.append(self._chunk[self._pos:end])
+            if size > 0:
+                size -= end - self._pos
+            self._pos = end
+        return b"".join(parts)
+
+class DockerContainerPool:
+    """
+    Keeps started containers idle between uses instead of stopping them, so repeated
+    provisioning with the same run configuration (image, mounts, env, workdir) skips container startup.
+    Only containers released with a reset command are pooled; the rest are discarded.
+    """
+
+    def __init__(self, client, max_idle: int = 4):
+        self.client = client
+        self.max_idle = max_idle
+        self._idle: List[Tuple[str, object]] = []  # (run configuration key, container), oldest first
+        self._keys: Dict[str, str] = {}  # container id -> run configuration key
+        self._lock = threading.Lock()
+        atexit.register(self.close)
+
+    @staticmethod
+    def _key(image_name: str, run_kwargs: Dict) -> str:
+        return json.dumps([image_name, run_kwargs], sort_keys=True, default=str)
+
+    def acquire(self, image_name: str, **run_kwargs):
+        key = self._key(image_name, run_kwargs)
+
+        while True:
+            with self._lock:
+                container = None
+                for i in range(len(self._idle) - 1, -1, -1):
+                    if self._idle[i][0] == key:
+                        container = self._idle.pop(i)[1]
+                        break
+            if container is None:
+                break
+            try:
+                container.reload()
+                if container.status == 'running':
+                    logger.info(f"Reusing pooled container {container.short_id}")
+                    return container
+            except APIError as e:
+                logger.warning(f"Dropping unusable pooled container: {e}")
+            self.discard(container)
+
+        logger.info(f"Starting container from image: {image_name}")
+        requested_at = int(time.time()) - 1
+        container = self.client.containers.run(
+            image_name,
+            command="tail -f /dev/null",  # Keep container alive
+            detach=True,
+            **run_kwargs
+        )
+        with self._lock:
+            self._keys[container.id] = key
+
+        try:
+            self._wait_until_running(container, requested_at)
+        except BaseException:
+            self.discard(container)
+            raise
+
+        return container
+
+    def _wait_until_running(self, container, since: int, timeout: int = 60):
+        # run() returns once the start request is accepted, so usually one inspect suffices
+        container.reload()
+        if container.status == 'running':
+            return
+
+        # Otherwise block on the daemon's event stream. Replaying from `since` covers a start
+        # that happened before the subscription; `until` bounds the wait.
+        events = self.client.events(
+            since=since,
+            until=int(time.time()) + timeout,
+            filters={"container": container.id, "event": ["start", "die"]},
+            decode=True
+        )
+        try:
+            for event in events:
+                action = event.get("Action") or event.get("status")
+                if action == "start":
+                    return
+                if action == "die":
+                    raise ContainerExecutionError(f"Container {container.short_id} exited during startup")
+        finally:
+            events.close()
+
+        container.reload()
+        if container.status != 'running':
+            raise ContainerExecutionError(f"Container {container.short_id} not running after {timeout}s")
+
+    def release(self, container, reset_cmd: Optional[str] = None):
+        if not reset_cmd:
+            # Nothing to undo the last user's changes with, so the container is not handed out again
+            self.discard(container)
+            return
+
+        try:
+            result = container.exec_run(["/bin/sh", "-c", reset_cmd])
+            if result.exit_code != 0:
+                logger.warning(f"Reset command failed in {container.short_id}; not returning it to the pool.")
+                self.discard(container)
+                return
+        except APIError as e:
+            logger.warning(f"Reset command failed in {container.short_id}: {e}")
+            self.discard(container)
+            return
+
+        evicted = []
+        with self._lock:
+            key = self._keys.get(container.id)
+            if key is None:
+                evicted.append(container)
+            else:
+                self._idle.append((key, container))
+                # The cap is global: mounts differ per bug, so per-key caps would not bound the total
+                while len(self._idle) > self.max_idle:
+                    evicted.append(self._idle.pop(0)[1])
+
+        for stale in evicted:
+            self.discard(stale)
+
+    def discard(self, container):
+        with self._lock:
+            self._keys.pop(container.id, None)
+
+        logger.info(f"Stopping and removing container {container.short_id}...")
+        try:
+            container.stop(timeout=1)
+            container.remove(force=True)
+        except Exception as e:
+            logger.warning(f"Error during container cleanup: {e}")
+
+    def close(self):
+        with self._lock:
+            containers = [container for _, container in self._idle]
+            self._idle.clear()
+        for container in containers:
+            self.discard(container)
+
 class DockerContainerManager:
 
     def __init__(self,
                  image_name: str,
                  timeout: int = 600,
                  mem_limit: str = "4g",
-                 nano_cpus: int = 2000000000):
+                 nano_cpus: int = 2000000000,
+                 pool_size: int = 4):
 
         self.image_name = image_name
         self.timeout = timeout
@@ -37,66 +203,56 @@ class DockerContainerManager:
             logger.critical("Failed to connect to Docker daemon. Is it running?")
             raise ContainerExecutionError("Docker daemon unreachable") from e
 
+        self.pool = DockerContainerPool(self.client, max_idle=pool_size)
+
+        # (container id, path) -> digest of the last content uploaded there
+        self._write_cache: Dict[Tuple[str, str], bytes] = {}
+        self._write_lock = threading.Lock()
+
     @contextmanager
     def provision_container(self,
                             volumes: Optional[Dict[str, Dict]] = None,
                             environment: Optional[Dict] = None,
-                            working_dir: str = "/workspace"):
+                            working_dir: str = "/workspace",
+                            reset_cmd: Optional[str] = None):
 
         container = None
+        reusable = False
         try:
-            logger.info(f"Starting container from image: {self.image_name}")
-            container = self.client.containers.run(
+            container = self.pool.acquire(
                 self.image_name,
-                command="tail -f /dev/null",  # Keep container alive
-                detach=True,
                 volumes=volumes,
                 environment=environment,
                 working_dir=working_dir,
                 **self.host_config
             )
 
-            while container.status != 'running':
-                container.reload()
-                time.sleep(0.1)
-
             yield container
+            reusable = True
 
         except APIError as e:
             logger.error(f"Docker API error during provisioning: {e}")
             raise ContainerExecutionError(f"Failed to start container: {e}")
         finally:
             if container:
-                logger.info(f"Stopping and removing container {container.short_id}...")
-                try:
-                    container.stop(timeout=1)
-                    container.remove(force=True)
-                except Exception as e:
-                    logger.warning(f"Error during container cleanup: {e}")
+                self._forget_writes(container.id)
+                # Containers are only pooled after a clean exit; anything else may have left them in a bad state
+                if reusable:
+                    self.pool.release(container, reset_cmd)
+                else:
+                    self.pool.discard(container)
 
     def exec_command(self,
                      container,
                      cmd: str,
                      workdir: Optional[str] = None,
-                     timeout: Optional[int] = None) -> Tuple[int, str, str]:
+                     timeout: Optional[int] = None) -> Tuple[int, bytes, bytes]:
+        """Runs `cmd` via /bin/sh and returns (exit_code, stdout, stderr) as raw bytes; callers decode what they keep."""
 
         timeout = timeout or self.timeout
         logger.debug(f"Exec in {container.short_id}: {cmd}")
         wrapped_cmd = ["/bin/sh", "-c", cmd]
         try:
-
-            exec_id = self.client.api.exec_create(
-                container.id,
-                wrapped_cmd,
-                workdir=workdir,
-                stdout=True,
-                stderr=True
-            )
-
-            stream = self.client.api.exec_start(exec_id, detach=False)
-
-            exit_code = self.client.api.exec_inspect(exec_id)['ExitCode']
-
             result = container.exec_run(
                 wrapped_cmd,
                 workdir=workdir,
@@ -104,55 +260,92 @@ class DockerContainerManager:
             )
 
             stdout_bytes, stderr_bytes = result.output
-            exit_code = result.exit_code
-
-            stdout = stdout_bytes.decode('utf-8', errors='replace') if stdout_bytes else ""
-            stderr = stderr_bytes.decode('utf-8', errors='replace') if stderr_bytes else ""
-
-            return exit_code, stdout, stderr
+            return result.exit_code, stdout_bytes or b"", stderr_bytes or b""
 
         except Exception as e:
             logger.error(f"Command execution failed: {e}")
-            return -1, "", str(e)
+            return -1, b"", str(e).encode('utf-8')
 
     def write_file(self, container, content: str, filepath: str):
+        self.write_files(container, {filepath: content})
+
+    def write_files(self, container, files: Dict[str, str]):
+        """Writes {absolute container path: content} in a single put_archive round-trip."""
+        if not files:
+            return
+
+        # Paths under a mount can be changed from the host (FileManager patches and restores
+        # checkouts there), so only container-local files are skipped on a matching digest
+        mounts = self._mount_points(container)
+
+        pending = {}
+        with self._write_lock:
+            for filepath, content in files.items():
+                file_data = content.encode('utf-8')
+                if self._is_mounted(filepath, mounts):
+                    pending[filepath] = (file_data, None)
+                    continue
+                digest = hashlib.blake2b(file_data, digest_size=16).digest()
+                if self._write_cache.get((container.id, filepath)) != digest:
+                    pending[filepath] = (file_data, digest)
+
+        if not pending:
+            logger.debug(f"Skipped unchanged write of {', '.join(files)}")
+            return
 
         tar_stream = io.BytesIO()
-        file_data = content.encode('utf-8')
-        info = tarfile.TarInfo(name=os.path.basename(filepath))
-        info.size = len(file_data)
-        info.mtime = time.time()
+        mtime = time.time()
 
         with tarfile.open(fileobj=tar_stream, mode='w') as tar:
-            tar.addfile(info, io.BytesIO(file_data))
+            for filepath, (file_data, _) in pending.items():
+                # Rooted at "/"; the daemon creates missing parent directories on extraction
+                info = tarfile.TarInfo(name=posixpath.normpath(filepath).lstrip("/"))
+                info.size = len(file_data)
+                info.mtime = mtime
+                tar.addfile(info, io.BytesIO(file_data))
 
         tar_stream.seek(0)
 
-        dir_path = os.path.dirname(filepath)
-
         try:
-            container.exec_run(f"mkdir -p {dir_path}")
-
             container.put_archive(
-                path=dir_path,
+                path="/",
                 data=tar_stream
             )
-            logger.debug(f"Wrote file to container: {filepath}")
+            logger.debug(f"Wrote {len(pending)} file(s) to container: {', '.join(pending)}")
         except Exception as e:
-            logger.error(f"Failed to write file {filepath}: {e}")
+            logger.error(f"Failed to write files {', '.join(pending)}: {e}")
             raise ContainerExecutionError(f"File write failed: {e}")
 
+        with self._write_lock:
+            for filepath, (_, digest) in pending.items():
+                if digest is not None:
+                    self._write_cache[(container.id, filepath)] = digest
+
+    @staticmethod
+    def _mount_points(container) -> Tuple[str, ...]:
+        return tuple(
+            posixpath.normpath(mount["Destination"])
+            for mount in container.attrs.get("Mounts", [])
+            if mount.get("Destination")
+        )
+
+    @staticmethod
+    def _is_mounted(filepath: str, mounts: Tuple[str, ...]) -> bool:
+        path = posixpath.normpath(filepath)
+        return any(path == mount or path.startswith(mount.rstrip("/") + "/") for mount in mounts)
+
+    def _forget_writes(self, container_id: str):
+        with self._write_lock:
+            for key in [k for k in self._write_cache if k[0] == container_id]:
+                del self._write_cache[key]
+
     def read_file(self, container, filepath: str) -> str:
 
         try:
             bits, stat = container.get_archive(filepath)
 
-            file_obj = io.BytesIO()
-            for chunk in bits:
-                file_obj.write(chunk)
-            file_obj.seek(0)
-
-            with tarfile.open(fileobj=file_obj, mode='r') as tar:
+            # Stream mode ('r|') decodes tar blocks as they arrive instead of buffering the whole archive
+            with tarfile.open(fileobj=_IterReader(bits), mode='r|') as tar:
                 member = tar.next()
                 f = tar.extractfile(member)
                 if f:
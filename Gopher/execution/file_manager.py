@@ -1,18 +1,50 @@
 import os
 import shutil
 import logging
+import re
 import json
 import difflib
-from typing import Optional, List, Dict, Any
+import subprocess
+import tempfile
+from dataclasses import dataclass
+from typing import Optional, List, Dict, Any, Union
 from pathlib import Path
 
+from Gopher.core.compat import add_slots
+
 logger = logging.getLogger(__name__)
 
+_HUNK_HEADER_RE = re.compile(r"^(@@ [^@]+ @@).*\n", re.MULTILINE)
+_NO_NEWLINE_MARKER = "\n\\ No newline at end of file\n"
+
 class FileOperationError(Exception):
     pass
 
+@add_slots
+@dataclass(frozen=True)
+class FileLayout:
+    """Paths derived from one source file, computed once per repair session instead of per call."""
+    file: Path
+    backup: Path
+    tmp: Path
+
+    @classmethod
+    def for_file(cls, file_path: Union[str, Path]) -> "FileLayout":
+        file = Path(file_path)
+        return cls(
+            file=file,
+            backup=file.with_suffix(file.suffix + ".bak"),
+            tmp=file.with_name(f"{file.name}.{os.getpid()}.tmp")
+        )
+
+def _layout(file_path: Union[str, FileLayout]) -> FileLayout:
+    return file_path if isinstance(file_path, FileLayout) else FileLayout.for_file(file_path)
+
 class FileManager:
 
+    # Above this many lines, `git diff` (Myers in C) beats difflib despite the process spawn
+    GIT_DIFF_MIN_LINES = 1000
+
     def __init__(self, workspace_root: str):
 
         self.workspace_root = Path(workspace_root)
@@ -27,10 +59,10 @@ class FileManager:
             logger.error(f"Failed to read file {file_path}: {e}")
             raise FileOperationError(f"Read failed: {e}")
 
-    def backup_file(self, file_path: str) -> bool:
+    def backup_file(self, file_path: Union[str, FileLayout]) -> bool:
 
-        src = Path(file_path)
-        dst = src.with_suffix(src.suffix + ".bak")
+        layout = _layout(file_path)
+        file_path, src, dst = layout.file, layout.file, layout.backup
 
         if not src.exists():
             logger.error(f"Cannot backup non-existent file: {file_path}")
@@ -41,23 +73,31 @@ class FileManager:
             return True
 
         try:
-            shutil.copy2(src, dst)
+            # A hard link costs no data copy; write_patch replaces the file rather than
+            # writing through it, so the backup keeps the original content.
+            try:
+                os.link(src, dst)
+            except OSError:
+                shutil.copy2(src, dst)
             logger.info(f"Backup created: {dst}")
             return True
         except IOError as e:
             logger.error(f"Failed to create backup for {file_path}: {e}")
             raise FileOperationError(f"Backup failed: {e}")
 
-    def restore_file(self, file_path: str) -> bool:
+    def restore_file(self, file_path: Union[str, FileLayout]) -> bool:
 
-        src = Path(file_path)
-        backup = src.with_suffix(src.suffix + ".bak")
+        layout = _layout(file_path)
+        file_path, src, backup = layout.file, layout.file, layout.backup
 
         if not backup.exists():
             logger.warning(f"No backup found to restore for {file_path}")
             return False
 
         try:
+            if src.exists() and os.path.samefile(backup, src):
+                logger.debug(f"{file_path} is unchanged since backup, nothing to restore.")
+                return True
             shutil.copy2(backup, src)
             logger.info(f"Restored original file: {file_path}")
             return True
@@ -65,47 +105,112 @@ class FileManager:
             logger.error(f"Failed to restore file {file_path}: {e}")
             raise FileOperationError(f"Restore failed: {e}")
 
-    def write_patch(self, file_path: str, new_content: str, create_backup: bool = True):
+    def write_patch(self, file_path: Union[str, FileLayout], new_content: str, create_backup: bool = True):
 
+        layout = _layout(file_path)
         if create_backup:
-            self.backup_file(file_path)
+            self.backup_file(layout)
 
+        file_path, tmp_path = layout.file, layout.tmp
         try:
-            with open(file_path, 'w', encoding='utf-8') as f:
+            # Write-and-replace gives the file a new inode, leaving a hard-linked backup untouched
+            with open(tmp_path, 'w', encoding='utf-8') as f:
                 f.write(new_content)
+            if os.path.exists(file_path):
+                shutil.copymode(file_path, tmp_path)
+            os.replace(tmp_path, file_path)
             logger.debug(f"Patch written to {file_path}")
         except IOError as e:
             logger.error(f"Failed to write patch to {file_path}: {e}")
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
             raise FileOperationError(f"Patch write failed: {e}")
 
+    def clone_with_patch(self, tree: Union[str, Path], dest: Union[str, Path], rel_file: Union[str, Path], new_content: str) -> Path:
+        """Copies the working tree `tree` to `dest` and applies the patch to `rel_file` in the copy only."""
+        dest = Path(dest)
+        try:
+            shutil.copytree(tree, dest, symlinks=True)
+        except (IOError, shutil.Error) as e:
+            logger.error(f"Failed to copy {tree} to {dest}: {e}")
+            raise FileOperationError(f"Tree copy failed: {e}")
+        self.write_patch(dest / rel_file, new_content, create_backup=False)
+        return dest
+
     def save_result(self, filename: str, data: Dict[str, Any]):
 
         output_dir = self.workspace_root / "outputs"
         output_dir.mkdir(exist_ok=True)
 
         target_path = output_dir / filename
+        tmp_path = target_path.with_name(f"{target_path.name}.tmp")
 
         try:
-            with open(target_path, 'w', encoding='utf-8') as f:
+            # Write-and-replace: a crash mid-write leaves the previous file intact
+            with open(tmp_path, 'w', encoding='utf-8') as f:
                 json.dump(data, f, indent=4, ensure_ascii=False)
+            os.replace(tmp_path, target_path)
             logger.info(f"Result saved to {target_path}")
         except IOError as e:
             logger.error(f"Failed to save result json: {e}")
 
     def compute_diff(self, original: str, modified: str, file_label: str = "") -> str:
 
+        original_lines = original.splitlines(keepends=True)
+        modified_lines = modified.splitlines(keepends=True)
+
+        if max(len(original_lines), len(modified_lines)) >= self.GIT_DIFF_MIN_LINES:
+            hunks = self._git_diff_hunks(original, modified)
+            if hunks is not None:
+                return f"--- a/{file_label}+++ b/{file_label}{hunks}" if hunks else ""
+
         diff = difflib.unified_diff(
-            original.splitlines(keepends=True),
-            modified.splitlines(keepends=True),
+            original_lines,
+            modified_lines,
             fromfile=f"a/{file_label}",
             tofile=f"b/{file_label}",
             lineterm=""
         )
         return "".join(diff)
 
-    def delete_backup(self, file_path: str):
+    def _git_diff_hunks(self, original: str, modified: str) -> Optional[str]:
+        # Returns the hunks of `git diff --no-index` (headers stripped), or None if git is unavailable
+        if not shutil.which("git"):
+            return None
 
-        backup = Path(file_path).with_suffix(Path(file_path).suffix + ".bak")
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            before, after = os.path.join(tmp_dir, "a"), os.path.join(tmp_dir, "b")
+            with open(before, 'w', encoding='utf-8', newline='') as f:
+                f.write(original)
+            with open(after, 'w', encoding='utf-8', newline='') as f:
+                f.write(modified)
+
+            try:
+                proc = subprocess.run(
+                    ["git", "diff", "--no-index", "--no-color", "--no-ext-diff", "--no-textconv", before, after],
+                    capture_output=True
+                )
+            except OSError as e:
+                logger.debug(f"git diff unavailable, falling back to difflib: {e}")
+                return None
+
+        # Exit code 1 means "files differ"; anything above is an error
+        if proc.returncode > 1:
+            logger.debug(f"git diff failed ({proc.returncode}), falling back to difflib.")
+            return None
+
+        output = proc.stdout.decode('utf-8', errors='replace')
+        hunk_start = output.find("\n@@")
+        if hunk_start < 0:
+            return ""
+        # Reshape into compute_diff's difflib form (lineterm=""): hunk headers carry no function
+        # context or line break, and a last line without a newline is left unterminated
+        hunks = _HUNK_HEADER_RE.sub(r"\1", output[hunk_start + 1:])
+        return hunks.replace(_NO_NEWLINE_MARKER, "")
+
+    def delete_backup(self, file_path: Union[str, FileLayout]):
+
+        backup = _layout(file_path).backup
         if backup.exists():
             try:
                 os.remove(backup)
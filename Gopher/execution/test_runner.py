@@ -1,25 +1,63 @@
+import os
+import json
 import logging
 import re
 import time
-from typing import Dict, Any, Optional
-from Gopher.core.patch import TestResult
+import threading
+from dataclasses import asdict, replace
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from typing import Dict, Any, Optional, List, Tuple
+from Gopher.core.patch import TestResult, CandidatePatch
 from Gopher.core.artifact import BuggyArtifact
-from Gopher.execution.container import DockerContainerManager
+from Gopher.execution.container import DockerContainerManager, ContainerExecutionError
+from Gopher.execution.file_manager import FileManager
 
 logger = logging.getLogger(__name__)
 
+# Byte patterns: container output is parsed undecoded and only the captured parts are decoded
+_D4J_FAIL_RE = re.compile(rb"Failing tests: (\d+)")
+_D4J_TEST_RE = re.compile(rb"^\s*-\s+(.*)$", re.MULTILINE)
+_GRADLE_FAIL_RE = re.compile(rb"((?:[a-zA-Z_0-9]+\.)+[a-zA-Z_0-9]+)\s+>\s+([a-zA-Z_0-9]+)\s+FAILED")
+_GRADLE_ERROR_LINE_RE = re.compile(rb"^.*(?:Exception|Error|at ).*$", re.MULTILINE)
+_COMPILE_ERROR_LINE_RE = re.compile(rb"^[^\r\n]*(?:error|Error):[^\r\n]*", re.MULTILINE)
+
+
+def _text(data: bytes) -> str:
+    return data.decode('utf-8', errors='replace')
+
+
 class TestRunner:
 
-    def __init__(self, config: Dict[str, Any], container_manager: DockerContainerManager):
+    # Below this many jobs per worker, container setup costs more than the parallelism saves
+    MIN_JOBS_PER_WORKER = 2
+    RESULT_CACHE_FILE = "test_cache.json"
+
+    def __init__(self,
+                 config: Dict[str, Any],
+                 container_manager: DockerContainerManager,
+                 file_manager: Optional[FileManager] = None):
 
         self.config = config
         self.container_manager = container_manager
         self.datasets_config = config.get("datasets", {})
-        self.d4j_projects = {
+
+        # (artifact, patch content) -> result; LLMs often re-emit earlier attempts verbatim
+        self.file_manager = file_manager
+        self._result_cache: Dict[str, TestResult] = self._load_result_cache()
+        self._cache_lock = threading.Lock()
+        # Caps batch containers across all concurrent sessions, not just within one batch
+        self._container_slots = threading.BoundedSemaphore(self._max_parallel_workers())
+        self.d4j_projects = frozenset({
             "Chart", "Cli", "Closure", "Codec", "Collections", "Compress",
             "Csv", "Gson", "JacksonCore", "JacksonDatabind", "JacksonXml",
             "Jsoup", "JxPath", "Lang", "Math", "Mockito", "Time"
-        }
+        })
+
+        # Command templates are fixed for the runner's lifetime; only {work_dir} varies per bug
+        d4j_cfg = self.datasets_config.get("defects4j", {})
+        self._d4j_compile_tmpl = d4j_cfg.get("compile_cmd", "defects4j compile")
+        self._d4j_test_tmpl = d4j_cfg.get("test_cmd", "defects4j test")
         # L = ['Chart-1', 'Chart-10', 'Chart-11', 'Chart-12', 'Chart-13', 'Chart-17', 'Chart-20', 'Chart-24', 'Chart-26',
         #      'Chart-3', 'Chart-4', 'Chart-5', 'Chart-6', 'Chart-7', 'Chart-8', 'Chart-9',
         #      'Closure-1', 'Closure-10', 'Closure-101', 'Closure-102', 'Closure-104', 'Closure-105', 'Closure-107',
@@ -54,7 +92,19 @@ class TestRunner:
         #      'Time-25', 'Time-27', 'Time-4', 'Time-5', 'Time-7', 'Time-8'
         #      ]
 
-    def run_tests(self, artifact: BuggyArtifact, container, timeout: int = 300) -> TestResult:
+    def run_tests(self,
+                  artifact: BuggyArtifact,
+                  container,
+                  timeout: int = 300,
+                  patch: Optional[CandidatePatch] = None) -> TestResult:
+
+        cache_key = self._cache_key(artifact, patch)
+        if cache_key is not None:
+            cached = self.cached_result(artifact, patch)
+            if cached is not None:
+                logger.info(f"Patch {patch.code_hash} was already evaluated for {artifact.identifier}; reusing result.")
+                return cached
+
         start_time = time.time()
 
         try:
@@ -77,16 +127,117 @@ class TestRunner:
                 failed_test_name="Infrastructure"
             )
 
-        result.execution_time = time.time() - start_time
+        result = replace(result, execution_time=time.time() - start_time)
+
+        # Infrastructure failures are transient and must not stick to the patch
+        if cache_key is not None and result.failed_test_name != "Infrastructure":
+            self._store_result(cache_key, result)
         return result
 
+    @staticmethod
+    def _cache_key(artifact: BuggyArtifact, patch: Optional[CandidatePatch]) -> Optional[str]:
+        return f"{artifact.identifier}:{patch.code_hash}" if patch is not None else None
+
+    def cached_result(self, artifact: BuggyArtifact, patch: CandidatePatch) -> Optional[TestResult]:
+        """The stored result for this patch content, if it was validated before (in any run)."""
+        with self._cache_lock:
+            return self._result_cache.get(self._cache_key(artifact, patch))
+
+    def run_tests_batch(self,
+                        jobs: List[Tuple[BuggyArtifact, str, CandidatePatch]],
+                        timeout: int = 300) -> List[TestResult]:
+        """
+        Validates independent patches concurrently, each in a container of its own.
+        A job is (artifact, host project root mounted at /workspace, patch), where the root is a
+        working tree with that patch already applied; jobs must not share a tree.
+        Results are returned in job order and go through the result cache like `run_tests`.
+        """
+        if not jobs:
+            return []
+
+        # Small batches run serially: a second worker only pays off once it has enough jobs to amortize its setup
+        workers = max(1, min(len(jobs) // self.MIN_JOBS_PER_WORKER, self._max_parallel_workers()))
+        logger.info(f"Running {len(jobs)} test jobs on {workers} worker(s).")
+
+        if workers == 1:
+            return [self._run_in_container(artifact, project_root, patch, timeout) for artifact, project_root, patch in jobs]
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = [
+                executor.submit(self._run_in_container, artifact, project_root, patch, timeout)
+                for artifact, project_root, patch in jobs
+            ]
+            return [future.result() for future in futures]
+
+    def _max_parallel_workers(self) -> int:
+        # Bounded by the pool size and by how many containers fit the host at their CPU quota
+        cpu_count = os.cpu_count() or 1
+        cpus_per_container = max(1, self.container_manager.host_config.get("nano_cpus", 0) // 1_000_000_000)
+        return max(1, min(self.container_manager.pool.max_idle, cpu_count // cpus_per_container))
+
+    def _run_in_container(self,
+                          artifact: BuggyArtifact,
+                          project_root: str,
+                          patch: CandidatePatch,
+                          timeout: int) -> TestResult:
+        # Checked before provisioning so a repeated patch costs no container
+        cached = self.cached_result(artifact, patch)
+        if cached is not None:
+            logger.info(f"Patch {patch.code_hash} was already evaluated for {artifact.identifier}; reusing result.")
+            return cached
+
+        volumes = {project_root: {'bind': '/workspace', 'mode': 'rw'}}
+        try:
+            with self._container_slots, self.container_manager.provision_container(volumes=volumes) as container:
+                return self.run_tests(artifact, container, timeout, patch=patch)
+        except Exception as e:
+            logger.error(f"Container provisioning failed for {artifact.identifier}: {e}")
+            return TestResult(
+                passed=False,
+                error_message=f"Internal Runner Error: {str(e)}",
+                failed_test_name="Infrastructure"
+            )
+
+    def _load_result_cache(self) -> Dict[str, TestResult]:
+        if self.file_manager is None:
+            return {}
+
+        cache_path = self.file_manager.workspace_root / "outputs" / self.RESULT_CACHE_FILE
+        if not cache_path.exists():
+            return {}
+
+        try:
+            with open(cache_path, 'r', encoding='utf-8') as f:
+                return {key: TestResult(**value) for key, value in json.load(f).items()}
+        except (OSError, ValueError, TypeError) as e:
+            logger.warning(f"Ignoring unreadable test result cache {cache_path}: {e}")
+            return {}
+
+    def _store_result(self, cache_key: str, result: TestResult):
+        with self._cache_lock:
+            self._result_cache[cache_key] = result
+            if self.file_manager is not None:
+                self.file_manager.save_result(
+                    self.RESULT_CACHE_FILE,
+                    {key: asdict(value) for key, value in self._result_cache.items()}
+                )
+
+    def _exec(self, container, cmd: str, workdir: str, timeout: int) -> Tuple[int, bytes, bytes]:
+        exit_code, stdout, stderr = self.container_manager.exec_command(
+            container, cmd, workdir=workdir, timeout=timeout
+        )
+        if exit_code == -1:
+            # exec_command's marker for a Docker/API failure: raised so run_tests reports it as
+            # "Infrastructure" and keeps it out of the result cache
+            raise ContainerExecutionError(_text(stderr))
+        return exit_code, stdout, stderr
+
     def _run_defects4j(self, artifact: BuggyArtifact, container, timeout: int) -> TestResult:
 
-        d4j_cfg = self.datasets_config.get("defects4j", {})
         work_dir = f"/workspace/{artifact.project_name}_{artifact.bug_id}"
 
-        compile_cmd = d4j_cfg.get("compile_cmd", "defects4j compile").format(work_dir=work_dir)
-        exit_code, stdout, stderr = self.container_manager.exec_command(
+        compile_cmd = self._d4j_compile_tmpl.replace("{work_dir}", work_dir)
+        exit_code, stdout, stderr = self._exec(
             container, compile_cmd, workdir=work_dir, timeout=timeout
         )
 
@@ -97,27 +248,27 @@ class TestRunner:
                 failed_test_name="Compilation"
             )
 
-        test_cmd = d4j_cfg.get("test_cmd", "defects4j test").format(work_dir=work_dir)
-        exit_code, stdout, stderr = self.container_manager.exec_command(
+        test_cmd = self._d4j_test_tmpl.replace("{work_dir}", work_dir)
+        exit_code, stdout, stderr = self._exec(
             container, test_cmd, workdir=work_dir, timeout=timeout
         )
 
         return self._parse_defects4j_output(stdout, stderr)
 
-    def _parse_defects4j_output(self, stdout: str, stderr: str) -> TestResult:
-        if "Failing tests: 0" in stdout:
+    def _parse_defects4j_output(self, stdout: bytes, stderr: bytes) -> TestResult:
+        if b"Failing tests: 0" in stdout:
             return TestResult(passed=True)
 
-        fail_match = re.search(r"Failing tests: (\d+)", stdout)
+        fail_match = _D4J_FAIL_RE.search(stdout)
         if fail_match:
             count = int(fail_match.group(1))
 
-            test_lines = re.findall(r"^\s*-\s+(.*)$", stdout, re.MULTILINE)
-            first_test = test_lines[0] if test_lines else "UnknownTest"
+            test_match = _D4J_TEST_RE.search(stdout)
+            first_test = _text(test_match.group(1)) if test_match else "UnknownTest"
 
             error_msg = f"Defects4J reported {count} failures."
             if stderr:
-                error_msg += f"\nOutput:\n{stderr[:1000]}"
+                error_msg += f"\nOutput:\n{_text(stderr[:1000])}"
 
             return TestResult(
                 passed=False,
@@ -127,14 +278,14 @@ class TestRunner:
 
         return TestResult(
             passed=False,
-            error_message=f"Defects4J execution failed unexpectedly:\n{stderr}\n{stdout[:500]}",
+            error_message=f"Defects4J execution failed unexpectedly:\n{_text(stderr)}\n{_text(stdout[:500])}",
             failed_test_name="ExecutionError"
         )
 
     def _run_gradle_test(self, artifact: BuggyArtifact, container, timeout: int) -> TestResult:
 
         cmd = "./gradlew test --info"
-        exit_code, stdout, stderr = self.container_manager.exec_command(
+        exit_code, stdout, stderr = self._exec(
             container, cmd, workdir="/workspace", timeout=timeout
         )
 
@@ -143,25 +294,20 @@ class TestRunner:
 
         return self._parse_gradle_output(stdout, stderr)
 
-    def _parse_gradle_output(self, stdout: str, stderr: str) -> TestResult:
+    def _parse_gradle_output(self, stdout: bytes, stderr: bytes) -> TestResult:
 
-        test_pattern = r"((?:[a-zA-Z_0-9]+\.)+[a-zA-Z_0-9]+)\s+>\s+([a-zA-Z_0-9]+)\s+FAILED"
-        match = re.search(test_pattern, stdout)
+        match = _GRADLE_FAIL_RE.search(stdout)
 
         failed_test = "UnknownTest"
+        error_lines = []
         if match:
-            failed_test = f"{match.group(1)}::{match.group(2)}"
+            failed_test = f"{_text(match.group(1))}::{_text(match.group(2))}"
 
-        error_lines = []
-        capture = False
-        for line in stdout.splitlines():
-            if "FAILED" in line and failed_test in line:
-                capture = True
-            if capture:
-                if any(x in line for x in ["Exception", "Error", "at "]):
-                    error_lines.append(line.strip())
-                if len(error_lines) > 5:  # Limit capture size
-                    break
+            # Exception/stack lines following the FAILED marker, scanned from the match onwards only
+            error_lines = [
+                _text(m.group(0).strip())
+                for m in islice(_GRADLE_ERROR_LINE_RE.finditer(stdout, match.end()), 6)  # Limit capture size
+            ]
 
         error_msg = "\n".join(error_lines) if error_lines else "Tests failed (check logs)"
 
@@ -175,7 +321,7 @@ class TestRunner:
 
         cmd = f"python3 scripts/run_quixbugs_test.py --bug {artifact.bug_id}"
 
-        exit_code, stdout, stderr = self.container_manager.exec_command(
+        exit_code, stdout, stderr = self._exec(
             container, cmd, workdir="/workspace", timeout=timeout
         )
 
@@ -184,22 +330,21 @@ class TestRunner:
 
         return self._parse_python_traceback(stderr + stdout)
 
-    def _parse_python_traceback(self, output: str) -> TestResult:
+    def _parse_python_traceback(self, output: bytes) -> TestResult:
 
-        lines = output.strip().splitlines()
-        if not lines:
+        if not output or output.isspace():
             return TestResult(passed=False, error_message="Empty error output", failed_test_name="Unknown")
 
-        last_line = lines[-1]
         return TestResult(
             passed=False,
-            error_message=output[-1000:],
+            error_message=_text(output[-1000:]),
             failed_test_name="QuixBugs_Test_Case"
         )
 
-    def _clean_compile_error(self, output: str) -> str:
+    def _clean_compile_error(self, output: bytes) -> str:
 
-        lines = [line for line in output.splitlines() if "error:" in line or "Error:" in line]
+        # Stops after the first five matching lines instead of splitting the whole log
+        lines = [_text(m.group(0)) for m in islice(_COMPILE_ERROR_LINE_RE.finditer(output), 5)]
         if lines:
-            return "\n".join(lines[:5])
-        return output[-500:]
\ No newline at end of file
+            return "\n".join(lines)
+        return _text(output[-500:])
\ No newline at end of file
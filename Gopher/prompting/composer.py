@@ -1,9 +1,11 @@
 import logging
-import yaml
 import os
-from typing import Dict, Any, Optional, List
+from dataclasses import dataclass
+from typing import Dict, Any, Optional, List, Tuple
 from jinja2 import Template, Environment, BaseLoader
 
+from Gopher.core.compat import add_slots
+from Gopher.core.config import load_yaml
 from Gopher.core.artifact import BuggyArtifact, DualLayerContext, RepairSession
 from Gopher.core.patch import TestResult
 from Gopher.LLM.token_manager import TokenManager
@@ -11,27 +13,54 @@ from Gopher.LLM.token_manager import TokenManager
 logger = logging.getLogger(__name__)
 
 
+@add_slots
+@dataclass(frozen=True)
+class SessionPromptState:
+    """Round-invariant prompt segments of one repair session; see `PromptComposer.prepare_session`."""
+    session: RepairSession
+    leading_text: str
+    buggy_code_text: str
+    trailing_text: str
+    static_parts: Tuple[str, ...]
+    static_tokens: int
+
+
 class PromptComposer:
     def __init__(self, config_path: str, token_manager: TokenManager):
 
         self.token_manager = token_manager
         self.templates = self._load_templates(config_path)
-        self.env = Environment(loader=BaseLoader())
+        self.env = Environment(loader=BaseLoader(), auto_reload=False, cache_size=400)
+        self._compiled = self._compile_templates()
 
     def _load_templates(self, path: str) -> Dict[str, Any]:
         if not os.path.exists(path):
             raise FileNotFoundError(f"Prompt template file not found: {path}")
 
-        with open(path, 'r') as f:
-            return yaml.safe_load(f)
+        return load_yaml(path)
+
+    def _compile_templates(self) -> Dict[str, Template]:
+        # Parsed and compiled once here; construct_prompt only renders
+        modules = self.templates["modules"]
+        return {
+            "buggy_artifact": self.env.from_string(modules["buggy_artifact"]),
+            "context.none": self.env.from_string(modules["context"]["none"]),
+            "context.slice": self.env.from_string(modules["context"]["slice"]),
+            "context.periphery": self.env.from_string(modules["context"]["periphery"]),
+            "feedback.failure": self.env.from_string(modules["test_feedback"]["failure"]),
+            "feedback.initial": self.env.from_string(modules["test_feedback"]["initial"]),
+            "trailing": self.env.from_string(modules["trailing"]),
+        }
 
     def construct_prompt(self,
                          session: RepairSession,
                          round_num: int,
                          test_result: Optional[TestResult] = None) -> str:
+        return self.render_round(self.prepare_session(session), round_num, test_result)
 
+    def prepare_session(self, session: RepairSession) -> SessionPromptState:
+        """Renders the prompt segments that do not change between rounds of a session."""
         artifact = session.artifact
-        context = session.context
 
         mod_leading_cfg = self.templates["modules"]["leading"]
         leading_text = (
@@ -39,8 +68,7 @@ class PromptComposer:
             f"{mod_leading_cfg['user_instruction']}"
         )
 
-        mod_artifact_tmpl = self.env.from_string(self.templates["modules"]["buggy_artifact"])
-        buggy_code_text = mod_artifact_tmpl.render(
+        buggy_code_text = self._compiled["buggy_artifact"].render(
             file_path=artifact.file_path,
             method_name=artifact.method_name,
             language=artifact.language,
@@ -48,14 +76,40 @@ class PromptComposer:
             bug_line_number=artifact.buggy_line_no
         )
 
-        mod_context_cfg = self.templates["modules"]["context"]
+        trailing_text = self._compiled["trailing"].render(language=artifact.language)
+
+        static_parts = (
+            leading_text,
+            "--------------------------------------------------",
+            buggy_code_text,
+            "--------------------------------------------------",
+            trailing_text
+        )
+
+        return SessionPromptState(
+            session=session,
+            leading_text=leading_text,
+            buggy_code_text=buggy_code_text,
+            trailing_text=trailing_text,
+            static_parts=static_parts,
+            # Tokenized once per session; each round only counts its context and feedback
+            static_tokens=self.token_manager.count_tokens("\n".join(static_parts))
+        )
+
+    def render_round(self,
+                     state: SessionPromptState,
+                     round_num: int,
+                     test_result: Optional[TestResult] = None) -> str:
+
+        artifact = state.session.artifact
+        context = state.session.context
 
         if round_num == 1:
-            context_tmpl_str = mod_context_cfg["none"] # init: No context
+            context_tmpl = self._compiled["context.none"] # init: No context
             context_vars = {}
 
         elif round_num == 2:
-            context_tmpl_str = mod_context_cfg["slice"]
+            context_tmpl = self._compiled["context.slice"]
             context_vars = {
                 "language": artifact.language,
                 "data_dependency_slice": context.data_dependency_slice or "(None)",
@@ -63,66 +117,48 @@ class PromptComposer:
             }
 
         elif round_num == 3:
-            context_tmpl_str = mod_context_cfg["periphery"]
+            context_tmpl = self._compiled["context.periphery"]
             context_vars = {
                 "language": artifact.language,
                 "class_skeleton": context.peripheral_context or "(None)"
             }
         else:
-            context_tmpl_str = mod_context_cfg["none"] # Fallback
+            context_tmpl = self._compiled["context.none"] # Fallback
             context_vars = {}
 
-        context_text = self.env.from_string(context_tmpl_str).render(**context_vars)
-
-        mod_feedback_cfg = self.templates["modules"]["test_feedback"]
+        context_text = context_tmpl.render(**context_vars)
 
         if test_result and not test_result.passed:
-            feedback_tmpl_str = mod_feedback_cfg["failure"]
+            feedback_tmpl = self._compiled["feedback.failure"]
             feedback_vars = {
                 "error_message": test_result.error_message,
                 "failed_test_name": test_result.failed_test_name
             }
         else:
-            feedback_tmpl_str = mod_feedback_cfg["initial"]
+            feedback_tmpl = self._compiled["feedback.initial"]
             feedback_vars = {
                 "issue_description": "The code fails the provided test suite. Please analyze dependencies and fix it."
             }
 
-        feedback_text = self.env.from_string(feedback_tmpl_str).render(**feedback_vars)
+        feedback_text = feedback_tmpl.render(**feedback_vars)
 
-        mod_trailing_tmpl = self.env.from_string(self.templates["modules"]["trailing"])
-        trailing_text = mod_trailing_tmpl.render(language=artifact.language)
-
-        static_parts = [
-            leading_text,
-            "--------------------------------------------------",
-            buggy_code_text,
-            "--------------------------------------------------",
-            trailing_text
-        ]
-
-        optimized_context = self.token_manager.optimize_prompt(
-            static_parts=static_parts,
+        optimized_context, prompt_tokens = self.token_manager.optimize_prompt(
+            static_parts=state.static_parts,
             dynamic_context=context_text,
-            feedback_part=feedback_text
+            feedback_part=feedback_text,
+            static_tokens=state.static_tokens
         )
 
-        full_prompt = (
-            f"{leading_text}\n\n"
-            f"{buggy_code_text}\n\n"
-            f"{optimized_context}\n\n"
-            f"{feedback_text}\n\n"
-            f"{trailing_text}"
-        )
-
-        if not self.token_manager.check_fit(full_prompt):
+        # The count from optimize_prompt covers the same segments, so the prompt is not re-tokenized
+        if self.token_manager.check_fit_by_count(prompt_tokens):
+            full_prompt = "\n\n".join((
+                state.leading_text, state.buggy_code_text, optimized_context, feedback_text, state.trailing_text
+            ))
+        else:
             # logger.warning("Prompt is still too long after optimization. Forcing drastic truncation.")
-            full_prompt = (
-                f"{leading_text}\n\n"
-                f"{buggy_code_text}\n\n"
-                "(Context removed due to extreme length)\n\n"
-                f"{feedback_text}\n\n"
-                f"{trailing_text}"
-            )
+            full_prompt = "\n\n".join((
+                state.leading_text, state.buggy_code_text, "(Context removed due to extreme length)",
+                feedback_text, state.trailing_text
+            ))
 
         return full_prompt
\ No newline at end of file
@@ -1,29 +1,54 @@
+import asyncio
 import logging
 import re
+import sys
 import json
+import shutil
+import threading
 import time
-import yaml
+from contextlib import asynccontextmanager, contextmanager, nullcontext
 from pathlib import Path
 from typing import Optional, List, Dict, Any
 
+from Gopher.core.config import load_yaml
 from Gopher.core.artifact import BuggyArtifact, RepairSession, DualLayerContext
 from Gopher.core.patch import CandidatePatch, PatchStatus, TestResult
 
 
 from Gopher.analysis.CPG_joern import JoernBridge
 from Gopher.analysis.dual_layer_conetxt import ContextBuilder
-from Gopher.LLM.client import LLMFactory
+from Gopher.LLM.client import LLMFactory, AsyncLLMClient
 from Gopher.LLM.token_manager import TokenManager
 from Gopher.prompting.composer import PromptComposer
-from Gopher.execution.file_manager import FileManager
+from Gopher.execution.file_manager import FileManager, FileLayout
 from Gopher.execution.container import DockerContainerManager
 from Gopher.execution.test_runner import TestRunner
 
 logger = logging.getLogger(__name__)
 
+# First fenced block of an LLM reply, with an optional language tag (```java, ```c++, ...)
+_CODE_BLOCK_RE = re.compile(r"```[\w+-]*\r?\n(.*?)```", re.DOTALL)
+
+
+@asynccontextmanager
+async def _in_thread(cm):
+    """Enters and exits a blocking context manager (e.g. container provisioning) off the event loop."""
+    value = await asyncio.to_thread(cm.__enter__)
+    try:
+        yield value
+    except BaseException:
+        if not await asyncio.to_thread(cm.__exit__, *sys.exc_info()):
+            raise
+    else:
+        await asyncio.to_thread(cm.__exit__, None, None, None)
+
 
 class GopherWorkflow:
 
+    # Must stay byte-identical across calls (no timestamps, ids or per-bug data) so that
+    # provider prompt caching can reuse the prefilled prefix; see `prompt_cache` in settings.
+    SYSTEM_MESSAGE = "You are an expert automated program repair agent."
+
     def __init__(self, config_path: str = "configs/settings.yaml"):
 
         self.config = self._load_config(config_path)
@@ -40,39 +65,103 @@ class GopherWorkflow:
 
         self.file_manager = FileManager(str(self.workspace_root))
         self.container_cfg = self.config.get("datasets", {})
+        # One manager (and container pool) per image, shared by all bugs of a run
+        self._container_managers: Dict[str, DockerContainerManager] = {}
+        self._test_runners: Dict[str, TestRunner] = {}
+        # Container id -> slots for compile/test runs, so concurrent sessions sharing a
+        # container don't oversubscribe its CPU quota
+        self._validation_slots: Dict[str, threading.BoundedSemaphore] = {}
+        self._slots_lock = threading.Lock()
 
         self.max_rounds = self.config.get("strategy", {}).get("max_iterations", 3)
+        # Patches sampled per round (temperature > 0 only); several are validated in parallel containers
+        self.sample_size = max(1, self.config.get("strategy", {}).get("sample_size", 1))
 
     def _load_config(self, path: str) -> Dict[str, Any]:
-        with open(path, 'r') as f:
-            return yaml.safe_load(f)
-
-    def run_repair(self, artifact: BuggyArtifact, dataset_type: str = "defects4j"):
-
-        logger.info(f"Starting repair session for {artifact.identifier}...")
-
-        self.file_manager.backup_file(artifact.file_path)
-
-        logger.info("Step 1: Generatring Code Property Graph (CPG)...")
-        cpg_dir = self.workspace_root / "cpgs" / artifact.identifier
-        try:
-            cpg_path = self.joern.generate_cpg(artifact, str(cpg_dir))
-
-            logger.info("Step 2: Building Dual-Layer Context...")
+        return load_yaml(path)
 
-            ddg_slice, cdg_slice = self.context_builder.slicer.generate_slices(cpg_path, artifact)
-
-            periphery = self.context_builder.periphery.generate_context(cpg_path, artifact)
-
-            context = DualLayerContext(
-                data_dependency_slice=ddg_slice,
-                control_dependency_slice=cdg_slice,
-                peripheral_context=periphery
-            )
-
-        except Exception as e:
-            logger.error(f"Analysis failed: {e}. Proceeding with empty context.")
-            context = DualLayerContext()
+    def _container_manager(self, dataset_type: str) -> DockerContainerManager:
+        image_name = "defects4j-env" if dataset_type == "defects4j" else "python:3.9"
+        container_mgr = self._container_managers.get(image_name)
+        if container_mgr is None:
+            container_mgr = self._container_managers[image_name] = DockerContainerManager(image_name)
+        return container_mgr
+
+    def _project_root(self, artifact: BuggyArtifact, dataset_type: str) -> str:
+        """Host directory mounted at /workspace for this artifact."""
+        checkout = self._checkout_dir(artifact, dataset_type)
+        if checkout is not None:
+            # Defects4J tests run in /workspace/<project>_<bug_id>, so mount the checkout root above it
+            return str(checkout.parent)
+        return str(Path(artifact.file_path).parent.parent.parent)
+
+    def _checkout_dir(self, artifact: BuggyArtifact, dataset_type: str) -> Optional[Path]:
+        """The bug's own Defects4J checkout (<project>_<bug_id>), or None for other layouts."""
+        if dataset_type != "defects4j":
+            return None
+        checkout_dir = f"{artifact.project_name}_{artifact.bug_id}"
+        for parent in Path(artifact.file_path).parents:
+            if parent.name == checkout_dir:
+                return parent
+        return None
+
+    def sessions_isolated(self, artifacts: List[BuggyArtifact], dataset_type: str) -> bool:
+        """
+        Whether every artifact is patched, built and tested in a tree of its own. Only then can
+        sessions run concurrently: QuixBugs/Gradle bugs share one tree, so a test run there would
+        see (and be cached against) other sessions' patches.
+        """
+        trees = []
+        for artifact in artifacts:
+            checkout = self._checkout_dir(artifact, dataset_type)
+            if checkout is None:
+                return False
+            trees.append(checkout)
+        return len(set(trees)) == len(trees)
+
+    def _reset_cmd(self, artifact: BuggyArtifact, dataset_type: str) -> Optional[str]:
+        """Undoes a session's edits inside the mount so the container can be pooled; None if unknown."""
+        if dataset_type == "defects4j":
+            # Defects4J checkouts are git work trees; reverting tracked files drops leftover patches
+            return f"git -C /workspace/{artifact.project_name}_{artifact.bug_id} checkout -- ."
+        return None
+
+    def shared_project_root(self, artifacts: List[BuggyArtifact], dataset_type: str) -> Optional[str]:
+        """The /workspace mount common to all artifacts, or None when they need different mounts."""
+        roots = {self._project_root(artifact, dataset_type) for artifact in artifacts}
+        return roots.pop() if len(roots) == 1 else None
+
+    @contextmanager
+    def dataset_container(self, dataset_type: str, project_root: str):
+        """
+        One container for a whole run, to be passed to `run_repair` for every bug. Patched files
+        are restored on the host after each session, so nothing needs resetting in between.
+        Defects4J bugs work in separate checkouts under the mount; other datasets share one
+        tree, so their sessions must run one at a time (see `sessions_isolated`).
+        """
+        volumes = {project_root: {'bind': '/workspace', 'mode': 'rw'}}
+        with self._container_manager(dataset_type).provision_container(volumes=volumes) as container:
+            yield container
+
+    def run_repair(self, artifact: BuggyArtifact, dataset_type: str = "defects4j", container=None) -> bool:
+        return asyncio.run(self.run_repair_async(artifact, dataset_type=dataset_type, container=container))
+
+    async def run_repair_async(self,
+                               artifact: BuggyArtifact,
+                               dataset_type: str = "defects4j",
+                               container=None,
+                               llm_client: Optional[AsyncLLMClient] = None) -> bool:
+        """
+        Repairs one bug. Analysis, patch validation and container setup run in worker threads
+        and the LLM is awaited, so several sessions can be interleaved with asyncio.gather.
+        Without `llm_client` the synchronous client is called from a worker thread.
+        """
+        logger.info("Starting repair session for %s...", artifact.identifier)
+
+        layout = FileLayout.for_file(artifact.file_path)
+        self.file_manager.backup_file(layout)
+
+        context = await asyncio.to_thread(self._build_context, artifact)
         session = RepairSession(
             artifact=artifact,
             context=context,
@@ -80,78 +169,215 @@ class GopherWorkflow:
         )
 
         last_test_result: Optional[TestResult] = None
-        project_root = str(Path(artifact.file_path).parent.parent.parent)
-        volumes = {project_root: {'bind': '/workspace', 'mode': 'rw'}}
 
-        image_name = "defects4j-env" if dataset_type == "defects4j" else "python:3.9"
-        container_mgr = DockerContainerManager(image_name)
+        if container is not None:
+            container_ctx = nullcontext(container)
+        else:
+            volumes = {self._project_root(artifact, dataset_type): {'bind': '/workspace', 'mode': 'rw'}}
+            container_ctx = self._container_manager(dataset_type).provision_container(
+                volumes=volumes, reset_cmd=self._reset_cmd(artifact, dataset_type)
+            )
 
-        with container_mgr.provision_container(volumes=volumes) as container:
-            test_runner = TestRunner(self.config, container_mgr)
+        async with _in_thread(container_ctx) as container:
+            test_runner = self._test_runner(dataset_type)
+            prompt_state = self.composer.prepare_session(session)
 
             for round_num in range(1, self.max_rounds + 1):
-                logger.info(f"--- Round {round_num}/{self.max_rounds} (Context: {self._get_round_name(round_num)}) ---")
-                prompt = self.composer.construct_prompt(session, round_num, last_test_result)
+                logger.info("--- Round %s/%s (Context: %s) ---", round_num, self.max_rounds, self._get_round_name(round_num))
+                prompt = self.composer.render_round(prompt_state, round_num, last_test_result)
                 logger.info("Querying LLM...")
-                try:
-
-                    raw_response = self.llm_client.generate_completion(
-                        system_message="You are an expert automated program repair agent.",
-                        user_prompt=prompt
-                    )
-                except Exception as e:
-                    logger.error(f"LLM Generation failed: {e}")
+                raw_responses = await self._sample_completions(prompt, llm_client)
+                if not raw_responses:
                     continue
 
-                code_block = self._extract_code_block(raw_response)
-                if not code_block:
+                patches = self._candidate_patches(artifact, raw_responses, round_num)
+                if not patches:
                     logger.warning("No code block found in LLM response.")
                     last_test_result = TestResult(passed=False, error_message="LLM did not return a valid code block.")
                     continue
 
-                patch = CandidatePatch(
-                    bug_id=artifact.bug_id,
-                    raw_output=raw_response,
-                    cleaned_code=code_block,
-                    llm_model=self.llm_client.model_name,
-                    round_number=round_num
+                logger.info("Validating %s patch(es)...", len(patches))
+                last_test_result = await asyncio.to_thread(
+                    self._validate_candidates, artifact, layout, patches, test_runner, container, dataset_type
                 )
+                if last_test_result.passed:
+                    return True
 
-                logger.info("Validating Patch...")
-
-                try:
-                    self.file_manager.write_patch(artifact.file_path, patch.cleaned_code)
-                    patch.diff = self.file_manager.compute_diff(
-                        artifact.source_code, patch.cleaned_code, artifact.file_path
-                    )
-                except Exception as e:
-                    logger.error(f"Failed to apply patch: {e}")
-                    patch.status = PatchStatus.COMPILATION_FAILED
-                    last_test_result = TestResult(passed=False, error_message=f"File write error: {e}")
-                    self._record_patch(patch)
-                    continue
+        logger.info("Repair session finished. No fix found after %s rounds.", self.max_rounds)
+        self.file_manager.restore_file(layout)  # Final cleanup
+        return False
 
-                result = test_runner.run_tests(artifact, container)
-                patch.test_result = result
-                last_test_result = result
+    async def _sample_completions(self, prompt: str, llm_client: Optional[AsyncLLMClient]) -> List[str]:
+        # Several samples only differ when decoding is stochastic
+        samples = self.sample_size if self.llm_client.temperature > 0 else 1
+        if llm_client is not None:
+            calls = [
+                llm_client.generate_completion(system_message=self.SYSTEM_MESSAGE, user_prompt=prompt)
+                for _ in range(samples)
+            ]
+        else:
+            calls = [
+                asyncio.to_thread(self.llm_client.generate_completion, self.SYSTEM_MESSAGE, prompt)
+                for _ in range(samples)
+            ]
+
+        replies = await asyncio.gather(*calls, return_exceptions=True)
+        responses = []
+        for reply in replies:
+            if isinstance(reply, Exception):
+                logger.error("LLM Generation failed: %s", reply)
+            else:
+                responses.append(reply)
+        return responses
+
+    def _candidate_patches(self, artifact: BuggyArtifact, raw_responses: List[str], round_num: int) -> List[CandidatePatch]:
+        patches: Dict[str, CandidatePatch] = {}
+        for raw_response in raw_responses:
+            code_block = self._extract_code_block(raw_response)
+            if not code_block:
+                continue
+            patch = CandidatePatch(
+                bug_id=artifact.bug_id,
+                raw_output=raw_response,
+                cleaned_code=code_block,
+                llm_model=self.llm_client.model_name,
+                round_number=round_num
+            )
+            # Samples often repeat each other; each distinct patch is validated once
+            patches.setdefault(patch.code_hash, patch)
+        return list(patches.values())
 
-                if result.passed:
-                    logger.info(f"SUCCESS! Patch found in Round {round_num}.")
-                    patch.status = PatchStatus.PLAUSIBLE
-                    self._record_patch(patch, success=True)
+    def _build_context(self, artifact: BuggyArtifact) -> DualLayerContext:
+        logger.info("Step 1: Generatring Code Property Graph (CPG)...")
+        cpg_dir = self.workspace_root / "cpgs" / artifact.identifier
+        try:
+            cpg_path = self.joern.generate_cpg(artifact, str(cpg_dir), cache_dir=str(self.workspace_root / "cpg_cache"))
 
-                    self.file_manager.restore_file(artifact.file_path)
-                    return True
-                else:
-                    logger.info(f"Patch failed: {result.error_message[:100]}...")
-                    patch.status = PatchStatus.TEST_FAILED
-                    self._record_patch(patch, success=False)
+            logger.info("Step 2: Building Dual-Layer Context...")
 
-                    self.file_manager.restore_file(artifact.file_path)
+            ddg_slice, cdg_slice = self.context_builder.slicer.generate_slices(cpg_path, artifact)
 
-        logger.info(f"Repair session finished. No fix found after {self.max_rounds} rounds.")
-        self.file_manager.restore_file(artifact.file_path)  # Final cleanup
-        return False
+            periphery = self.context_builder.periphery.generate_context(cpg_path, artifact)
+
+            return DualLayerContext(
+                data_dependency_slice=ddg_slice,
+                control_dependency_slice=cdg_slice,
+                peripheral_context=periphery
+            )
+
+        except Exception as e:
+            logger.error("Analysis failed: %s. Proceeding with empty context.", e)
+            return DualLayerContext()
+
+    def _test_runner(self, dataset_type: str) -> TestRunner:
+        # Shared per manager so concurrent sessions use one result cache (and one test_cache.json writer)
+        container_mgr = self._container_manager(dataset_type)
+        test_runner = self._test_runners.get(container_mgr.image_name)
+        if test_runner is None:
+            test_runner = self._test_runners[container_mgr.image_name] = TestRunner(
+                self.config, container_mgr, self.file_manager
+            )
+        return test_runner
+
+    def _validation_slot(self, container, container_mgr: DockerContainerManager) -> threading.BoundedSemaphore:
+        with self._slots_lock:
+            slot = self._validation_slots.get(container.id)
+            if slot is None:
+                cpus = max(1, container_mgr.host_config.get("nano_cpus", 0) // 1_000_000_000)
+                slot = self._validation_slots[container.id] = threading.BoundedSemaphore(cpus)
+            return slot
+
+    def _validate_candidates(self,
+                             artifact: BuggyArtifact,
+                             layout: FileLayout,
+                             patches: List[CandidatePatch],
+                             test_runner: TestRunner,
+                             container,
+                             dataset_type: str) -> TestResult:
+        """Validates a round's patches; returns the first passing result, else the first sample's."""
+        checkout = self._checkout_dir(artifact, dataset_type)
+        if len(patches) > 1 and checkout is not None:
+            results = self._validate_batch(artifact, checkout, patches, test_runner)
+        else:
+            # In place, one at a time: without a per-bug checkout there is no tree to copy per patch
+            results = []
+            for patch in patches:
+                results.append(self._validate_patch(artifact, layout, patch, test_runner, container))
+                if results[-1].passed:
+                    break
+        return next((result for result in results if result.passed), results[0])
+
+    def _validate_batch(self,
+                        artifact: BuggyArtifact,
+                        checkout: Path,
+                        patches: List[CandidatePatch],
+                        test_runner: TestRunner) -> List[TestResult]:
+        # Each uncached patch is tested in its own copy of the checkout, in its own container
+        rel_file = Path(artifact.file_path).relative_to(checkout)
+        scratch_root = self.workspace_root / "scratch" / artifact.identifier
+        results: Dict[str, TestResult] = {}
+        jobs = []
+        try:
+            for patch in patches:
+                root = scratch_root / patch.code_hash
+                if test_runner.cached_result(artifact, patch) is None:
+                    try:
+                        self.file_manager.clone_with_patch(checkout, root / checkout.name, rel_file, patch.cleaned_code)
+                    except Exception as e:
+                        logger.error("Failed to apply patch: %s", e)
+                        patch.status = PatchStatus.COMPILATION_FAILED
+                        self._record_patch(patch)
+                        results[patch.code_hash] = TestResult(passed=False, error_message=f"File write error: {e}")
+                        continue
+                jobs.append((artifact, str(root), patch))
+
+            for (_, _, patch), result in zip(jobs, test_runner.run_tests_batch(jobs)):
+                self._record_result(artifact, patch, result)
+                results[patch.code_hash] = result
+        finally:
+            shutil.rmtree(scratch_root, ignore_errors=True)
+
+        return [results[patch.code_hash] for patch in patches]
+
+    def _validate_patch(self,
+                        artifact: BuggyArtifact,
+                        layout: FileLayout,
+                        patch: CandidatePatch,
+                        test_runner: TestRunner,
+                        container) -> TestResult:
+        try:
+            self.file_manager.write_patch(layout, patch.cleaned_code)
+        except Exception as e:
+            logger.error("Failed to apply patch: %s", e)
+            patch.status = PatchStatus.COMPILATION_FAILED
+            self._record_patch(patch)
+            return TestResult(passed=False, error_message=f"File write error: {e}")
+
+        with self._validation_slot(container, test_runner.container_manager):
+            result = test_runner.run_tests(artifact, container, patch=patch)
+        self._record_result(artifact, patch, result)
+
+        self.file_manager.restore_file(layout)
+        return result
+
+    def _record_result(self, artifact: BuggyArtifact, patch: CandidatePatch, result: TestResult):
+        patch.test_result = result
+
+        if result.passed:
+            logger.info("SUCCESS! Patch found in Round %s.", patch.round_number)
+            patch.status = PatchStatus.PLAUSIBLE
+            # Only plausible patches are reported with their diff, so failed rounds skip the diff
+            patch.diff = self.file_manager.compute_diff(
+                artifact.source_code, patch.cleaned_code, artifact.file_path
+            )
+            self._record_patch(patch, success=True)
+        else:
+            logger.info("Patch failed: %.100s...", result.error_message)
+            patch.status = PatchStatus.TEST_FAILED
+            self._record_patch(patch, success=False)
 
     def _extract_code_block(self, text: str) -> Optional[str]:
-        pass
\ No newline at end of file
+        if not text:
+            return None
+        match = _CODE_BLOCK_RE.search(text)
+        return match.group(1).strip() if match else None
\ No newline at end of file
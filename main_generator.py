@@ -1,17 +1,19 @@
 import argparse
+import asyncio
 import logging
-import json
 import sys
 import os
+from contextlib import nullcontext
 from pathlib import Path
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 
 import colorlog
+import orjson
 from tqdm import tqdm
 
 from Gopher.workflow import GopherWorkflow
 from Gopher.core.artifact import BuggyArtifact
-from Gopher.LLM.client import LLMFactory
+from Gopher.LLM.client import LLMFactory, AsyncLLMClient
 from Gopher.LLM.token_manager import TokenManager
 
 def setup_logging(log_level: str = "INFO"):
@@ -43,39 +45,47 @@ def setup_logging(log_level: str = "INFO"):
     file_handler.setFormatter(file_formatter)
     logger.addHandler(file_handler)
 
+def _artifact_from_item(item: Dict[str, Any]) -> Optional[BuggyArtifact]:
+    try:
+        return BuggyArtifact(
+            project_name=item["project_name"],
+            bug_id=str(item["bug_id"]),
+            file_path=item["file_path"],
+            method_name=item.get("method_name", "unknown"),
+            buggy_line_no=int(item.get("buggy_line_no", 0)),
+            source_code=item["source_code"],
+            language=item.get("language", "java")
+        )
+    except KeyError as e:
+        logging.warning("Skipping invalid artifact entry in manifest: Missing %s", e)
+        return None
+
 def load_artifacts(manifest_path: str, project_filter: str = None, bug_id_filter: str = None) -> List[BuggyArtifact]:
 
     path = Path(manifest_path)
     if not path.exists():
-        logging.error(f"Manifest file not found: {manifest_path}")
+        logging.error("Manifest file not found: %s", manifest_path)
         sys.exit(1)
 
-    with open(path, 'r', encoding='utf-8') as f:
-        data = json.load(f)
-
-    artifacts = []
-    for item in data:
-        if project_filter and item.get("project_name") != project_filter:
-            continue
-        if bug_id_filter and str(item.get("bug_id")) != str(bug_id_filter):
-            continue
-
-        try:
-            artifact = BuggyArtifact(
-                project_name=item["project_name"],
-                bug_id=str(item["bug_id"]),
-                file_path=item["file_path"],
-                method_name=item.get("method_name", "unknown"),
-                buggy_line_no=int(item.get("buggy_line_no", 0)),
-                source_code=item["source_code"],
-                language=item.get("language", "java")
-            )
-            artifacts.append(artifact)
-        except KeyError as e:
-            logging.warning(f"Skipping invalid artifact entry in manifest: Missing {e}")
+    data = orjson.loads(path.read_bytes())
+
+    # Apply the filters once up front so the build below only touches selected entries
+    if project_filter:
+        data = [item for item in data if item.get("project_name") == project_filter]
+    if bug_id_filter:
+        bug_id_filter = str(bug_id_filter)
+        data = [item for item in data if str(item.get("bug_id")) == bug_id_filter]
+
+    artifacts = [artifact for artifact in map(_artifact_from_item, data) if artifact is not None]
 
     return artifacts
 
+def write_summary(results: Dict[str, List[str]], summary_path: Path):
+    # Write-and-replace: readers never see a truncated summary, even if the process dies mid-write
+    tmp_path = summary_path.with_name(f"{summary_path.name}.tmp")
+    tmp_path.write_bytes(orjson.dumps(results, option=orjson.OPT_INDENT_2))
+    os.replace(tmp_path, summary_path)
+
 def main():
     parser = argparse.ArgumentParser(
         description="LLM-based Automated Program Repair Tool via Dual-Layer Context."
@@ -115,6 +125,14 @@ def main():
         choices=["defects4j", "quixbugs", "minecraft"],
         help="Dataset type to select correct test runner strategy."
     )
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=8,
+        help="Maximum number of bugs repaired concurrently; bugs sharing a working tree "
+             "(QuixBugs, Gradle) always run one at a time. Joern JVMs and test runs are "
+             "bounded separately (joern.max_parallel_jvms, container CPU quota)."
+    )
     parser.add_argument(
         "--debug",
         action="store_true",
@@ -129,27 +147,27 @@ def main():
 
     logger.info("Initializing Gopher APR Tool...")
 
-    logger.info(f"Loading artifacts from {args.manifest}...")
+    logger.info("Loading artifacts from %s...", args.manifest)
     artifacts = load_artifacts(args.manifest, args.project, args.bug_id)
 
     if not artifacts:
         logger.error("No artifacts found matching criteria. Exiting.")
         sys.exit(0)
 
-    logger.info(f"Found {len(artifacts)} bugs to process.")
+    logger.info("Found %s bugs to process.", len(artifacts))
 
     try:
         workflow = GopherWorkflow(config_path=args.config)
 
         if args.provider:
 
-            logger.info(f"Overriding LLM provider to: {args.provider}")
+            logger.info("Overriding LLM provider to: %s", args.provider)
             workflow.llm_client = LLMFactory.create_client(args.provider, args.config)
             workflow.token_manager = TokenManager(workflow.llm_client.model_name)
             workflow.composer.token_manager = workflow.token_manager
 
     except Exception as e:
-        logger.critical(f"Failed to initialize Gopher Workflow: {e}")
+        logger.critical("Failed to initialize Gopher Workflow: %s", e)
         sys.exit(1)
 
     results = {
@@ -158,46 +176,75 @@ def main():
         "errors": []
     }
 
-    pbar = tqdm(artifacts, desc="Repairing Bugs", unit="bug")
+    summary_path = Path(args.output_dir) / "execution_summary.json"
+    summary_path.parent.mkdir(parents=True, exist_ok=True)
 
-    for artifact in pbar:
-        pbar.set_postfix_str(f"Current: {artifact.identifier}")
-        logger.info(f"STARTING REPAIR: {artifact.identifier}")
+    pbar = tqdm(total=len(artifacts), desc="Repairing Bugs", unit="bug")
 
-        try:
-            is_fixed = workflow.run_repair(artifact, dataset_type=args.dataset)
+    concurrency = max(1, args.concurrency)
+    if concurrency > 1 and not workflow.sessions_isolated(artifacts, args.dataset):
+        logger.warning("Bugs share a working tree; repairing them one at a time instead of %s concurrently.", concurrency)
+        concurrency = 1
 
-            if is_fixed:
-                results["fixed"].append(artifact.identifier)
-                logger.info(f"FIXED: {artifact.identifier}")
-            else:
-                results["failed"].append(artifact.identifier)
-                logger.info(f"FAILED: {artifact.identifier}")
+    async def repair_all(container):
+        # Bounded fan-out: sessions overlap while waiting on the LLM
+        semaphore = asyncio.Semaphore(concurrency)
 
-        except KeyboardInterrupt:
-            logger.warning("Execution interrupted by user. Saving progress...")
-            break
-        except Exception as e:
-            logger.error(f"Unexpected error processing {artifact.identifier}: {e}", exc_info=True)
-            results["errors"].append(artifact.identifier)
+        async with AsyncLLMClient(workflow.llm_client) as llm_client:
 
-    # logger.info("=" * 50)
-    logger.info("EXECUTION SUMMARY")
-    # logger.info("=" * 50)
-    logger.info(f"Total Processed: {len(artifacts)}")
-    logger.info(f"Fixed: {len(results['fixed'])}")
-    logger.info(f"Failed: {len(results['failed'])}")
-    logger.info(f"Errors: {len(results['errors'])}")
+            async def repair(artifact: BuggyArtifact):
+                async with semaphore:
+                    pbar.set_postfix_str(f"Current: {artifact.identifier}")
+                    logger.info("STARTING REPAIR: %s", artifact.identifier)
 
-    if results["fixed"]:
-        logger.info(f"Fixed Bugs: {', '.join(results['fixed'])}")
+                    try:
+                        is_fixed = await workflow.run_repair_async(
+                            artifact, dataset_type=args.dataset, container=container, llm_client=llm_client
+                        )
 
-    summary_path = Path(args.output_dir) / "execution_summary.json"
-    summary_path.parent.mkdir(parents=True, exist_ok=True)
-    with open(summary_path, 'w') as f:
-        json.dump(results, f, indent=4)
+                        if is_fixed:
+                            results["fixed"].append(artifact.identifier)
+                            logger.info("FIXED: %s", artifact.identifier)
+                        else:
+                            results["failed"].append(artifact.identifier)
+                            logger.info("FAILED: %s", artifact.identifier)
+
+                    except Exception as e:
+                        logger.error("Unexpected error processing %s: %s", artifact.identifier, e, exc_info=True)
+                        results["errors"].append(artifact.identifier)
+                    finally:
+                        pbar.update(1)
+                        # Checkpoint after every bug so a crash or kill keeps the progress so far
+                        write_summary(results, summary_path)
 
-    logger.info(f"Summary saved to {summary_path}")
+            await asyncio.gather(*(repair(artifact) for artifact in artifacts))
+
+    # Provision once and reuse the container for every bug when they all fit under one mount
+    shared_root = workflow.shared_project_root(artifacts, args.dataset)
+    container_ctx = workflow.dataset_container(args.dataset, shared_root) if shared_root else nullcontext()
+
+    try:
+        with container_ctx as container:
+            try:
+                asyncio.run(repair_all(container))
+            except KeyboardInterrupt:
+                logger.warning("Execution interrupted by user. Saving progress...")
+    finally:
+        pbar.close()
+
+        # logger.info("=" * 50)
+        logger.info("EXECUTION SUMMARY")
+        # logger.info("=" * 50)
+        logger.info("Total Processed: %s", len(artifacts))
+        logger.info("Fixed: %s", len(results['fixed']))
+        logger.info("Failed: %s", len(results['failed']))
+        logger.info("Errors: %s", len(results['errors']))
+
+        if results["fixed"]:
+            logger.info("Fixed Bugs: %s", ', '.join(results['fixed']))
+
+        write_summary(results, summary_path)
+        logger.info("Summary saved to %s", summary_path)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -31,31 +31,23 @@ def run_tests(bug_id: str, algo_file: str, test_json_dir: str):
         print(f"Error loading module: {e}")
         sys.exit(1)
 
-    failed = 0
+    # One handler around the loop, but still stop at the first wrong output: several buggy
+    # programs never return on later inputs, so running on would hang instead of failing
     passed = 0
-
-    for i, test in enumerate(test_cases):
-        inputs = test["input"]
-        expected = test["output"]
-
-        try:
-            if isinstance(inputs, list):
-                result = func(*inputs)
-            else:
-                result = func(inputs)
-
-            if result == expected:
-                passed += 1
-            else:
+    try:
+        for i, test in enumerate(test_cases):
+            inputs = test["input"]
+            expected = test["output"]
+            result = func(*inputs) if isinstance(inputs, list) else func(inputs)
+            if result != expected:
                 print(f"FAIL Test {i}: Expected {expected}, got {result}")
-                failed += 1
                 sys.exit(1)
-
-        except Exception as e:
-            print(f"ERROR Test {i}: Exception raised: {e}")
-            import traceback
-            traceback.print_exc()
-            sys.exit(1)
+            passed += 1
+    except Exception as e:
+        print(f"ERROR Test {passed}: Exception raised: {e}")
+        import traceback
+        traceback.print_exc()
+        sys.exit(1)
 
     print(f"SUCCESS: {passed} tests passed.")
     sys.exit(0)
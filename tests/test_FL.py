@@ -0,0 +1,48 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from Gopher.execution import FL
+from Gopher.execution.FL import ochiai, ochiai_from_sets
+
+
+HIT_COUNTS = np.array([[2, 0, 1],
+                       [0, 3, 1],
+                       [1, 1, 0]])
+OUTCOMES = np.array([1, 0, 1])
+
+
+def test_hit_counts_are_treated_as_covered():
+    # ef/ep count tests, not hits: summing the counts would give stmt_0 ef=3 and stmt_1 ep=3
+    df = ochiai(HIT_COUNTS, OUTCOMES).set_index("stmt")
+
+    assert df.loc["stmt_0", "ef"] == 2
+    assert df.loc["stmt_0", "ep"] == 0
+    assert df.loc["stmt_1", "ef"] == 1
+    assert df.loc["stmt_1", "ep"] == 1
+
+
+def test_matches_set_based_ochiai():
+    exec_sets = [{f"stmt_{j}" for j in np.flatnonzero(row)} for row in HIT_COUNTS]
+    failing = {int(i) for i in np.flatnonzero(OUTCOMES)}
+    expected = ochiai_from_sets(exec_sets, failing,
+                                stmt_universe=[f"stmt_{j}" for j in range(3)])
+
+    result = ochiai(HIT_COUNTS, OUTCOMES)
+
+    pd.testing.assert_frame_equal(result, expected, check_dtype=False)
+
+
+@pytest.mark.skipif(not FL._HAS_NUMBA, reason="numba not installed")
+def test_backends_agree():
+    rng = np.random.default_rng(0)
+    # More than 64 tests so the bit-packed kernel spans several words
+    cov = rng.integers(0, 4, size=(131, 57)) * (rng.random((131, 57)) < 0.4)
+    outcomes = (rng.random(131) < 0.2).astype(int)
+    covered = cov != 0
+
+    ef_jit, ep_jit = FL._ochiai_counts_jit(covered, outcomes)
+    ef_blas, ep_blas = FL._ochiai_counts_blas(covered, outcomes)
+
+    np.testing.assert_array_equal(ef_jit, ef_blas)
+    np.testing.assert_array_equal(ep_jit, ep_blas)